@@ -0,0 +1,61 @@
+# Server-side filters for the aviationweather.gov area products.
+#
+# Rather than downloading a whole national feed and cutting it off at a
+# byte limit, each product lists the API parameters it accepts along with
+# the user's chosen values, and the request asks the server for just the
+# reports that matter around the selected station.
+#
+# Parameter values:
+#   "id"       - any value (e.g. True) sends the selected station's ICAO code
+#   "bbox"     - replaced by a box around the station's position; the
+#                value is the box's half-width in nautical miles
+#   "distance" - radius around "id" in nautical miles, only sent with "id"
+#   anything else (age, level, hazard, inten, type, ...) is sent as given.
+# A value of None leaves the parameter out.
+
+NM_PER_DEGREE = 60
+
+
+def bbox(lat, lon, radius_nm):
+    """``minLat,minLon,maxLat,maxLon`` box covering ``radius_nm`` around a point."""
+    import math
+
+    dlat = radius_nm / NM_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return "{:.2f},{:.2f},{:.2f},{:.2f}".format(
+        max(lat - dlat, -90), max(lon - dlon, -180),
+        min(lat + dlat, 90), min(lon + dlon, 180),
+    )
+
+
+def uses_station(query):
+    """True when ``query`` narrows the feed around the station ("id" or
+    "bbox"); otherwise every station gets the same national feed."""
+    return bool(query) and (query.get("id") is not None or query.get("bbox") is not None)
+
+
+def params(query, station=None, position=None):
+    """Return ``[(name, value)]`` for ``query``, sorted by name."""
+    result = []
+    for name in sorted(query):
+        value = query[name]
+        if value is None:
+            continue
+        if name == "id":
+            value = station
+        elif name == "distance" and not (station and query.get("id") is not None):
+            value = None
+        elif name == "bbox":
+            value = bbox(position[0], position[1], value) if position else None
+        if value is not None:
+            result.append((name, value))
+    return result
+
+
+def build_url(url, query, station=None, position=None):
+    """Append the query parameters for ``station`` to a product URL."""
+    pairs = params(query or {}, station, position)
+    if not pairs:
+        return url
+    sep = "&" if "?" in url else "?"
+    return url + sep + "&".join(f"{name}={value}" for name, value in pairs)
@@ -0,0 +1,195 @@
+"""Build stations.bin and stations.grd from a full airport list.
+
+Run this on a computer (CPython), not on the device:
+
+    python build_station_index.py airports.csv stations.bin
+
+stations.bin is the sorted record file read by station_index.py and
+stations.grd (written next to it) is the lat/lon bucket grid read by
+station_grid.py.
+
+The input is a CSV file with a header row.  Both a plain
+``icao,state,name,lat,lon`` layout and the OurAirports ``airports.csv``
+export (``ident``/``gps_code``/``icao_code``, ``iso_region``,
+``latitude_deg``, ``longitude_deg``) are understood.  Only four character
+alphanumeric codes are kept.  Copy the resulting files to the device next
+to the scripts.
+
+Every station goes into stations.bin, so any code can be typed.  The grid
+behind "Nearby Airports" only holds stations that issue METARs, since a
+strip without a weather station would only show "No data".  Pass the
+METAR station list with ``--metar-stations`` (one ICAO code per line, or a
+CSV with an ``icaoId``/``icao``/``station_id`` column, such as
+aviationweather.gov's station list).  Without it, medium and large
+airports and those with scheduled service are taken to report, which
+leaves out some small fields that do.
+"""
+
+import argparse
+import csv
+import math
+import os
+import struct
+import sys
+
+import station_grid
+from station_index import COORD_SCALE, HEADER, MAGIC, RECORD, RECORD_SIZE
+
+SKIP_TYPES = {"closed", "heliport", "seaplane_base", "balloonport"}
+# Without a METAR station list, airports of these types are taken to report
+REPORTING_TYPES = {"medium_airport", "large_airport"}
+
+
+def _pick(row, *names):
+    for name in names:
+        value = (row.get(name) or "").strip()
+        if value:
+            return value
+    return ""
+
+
+def _icao(row):
+    for name in ("icao", "icao_code", "gps_code", "ident"):
+        code = (row.get(name) or "").strip().upper()
+        if len(code) == 4 and code.isalnum():
+            return code
+    return None
+
+
+def _state(row):
+    state = _pick(row, "state")
+    if not state:
+        # OurAirports regions look like "US-TN"
+        state = _pick(row, "iso_region").split("-")[-1]
+    return state.upper()[:2]
+
+
+def _likely_reporting(row):
+    if "type" not in row and "scheduled_service" not in row:
+        # A plain icao,state,name,lat,lon list is taken as it is
+        return True
+    return row.get("type") in REPORTING_TYPES or row.get("scheduled_service") == "yes"
+
+
+def read_stations(path):
+    """Return ``[(icao, state, name, lat, lon)]`` sorted by ICAO code, and
+    the set of codes that are likely to issue METARs."""
+    stations = {}
+    likely = set()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get("type") in SKIP_TYPES:
+                continue
+            icao = _icao(row)
+            if not icao:
+                continue
+            try:
+                lat = float(_pick(row, "lat", "latitude_deg", "latitude"))
+                lon = float(_pick(row, "lon", "longitude_deg", "longitude"))
+            except ValueError:
+                continue
+            name = _pick(row, "name").upper()
+            stations[icao] = (icao, _state(row), name, lat, lon)
+            if _likely_reporting(row):
+                likely.add(icao)
+    return [stations[k] for k in sorted(stations)], likely
+
+
+def read_metar_stations(path):
+    """The ICAO codes in a METAR station list."""
+    with open(path, newline="", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        if "," not in first:
+            return {line.strip().upper() for line in f if len(line.strip()) == 4}
+        codes = set()
+        for row in csv.DictReader(f):
+            code = _pick(row, "icaoId", "icao", "station_id", "ident").upper()
+            if len(code) == 4:
+                codes.add(code)
+        return codes
+
+
+def pack_record(icao, state, name, lat, lon):
+    return struct.pack(
+        RECORD,
+        icao.encode("ascii"),
+        state.encode("ascii", "replace").ljust(2),
+        name.encode("ascii", "replace")[:26],
+        round(lat * COORD_SCALE),
+        round(lon * COORD_SCALE),
+    )
+
+
+def write_index(stations, path):
+    with open(path, "wb") as f:
+        f.write(struct.pack(HEADER, MAGIC, RECORD_SIZE, len(stations)))
+        for station in stations:
+            f.write(pack_record(*station))
+
+
+def write_grid(stations, path, cell_deg=2.0, reporting=None):
+    """Bucket stations (in stations.bin order) into a lat/lon grid file.
+
+    Only the codes in ``reporting`` are bucketed when it is given.
+    """
+    lat0 = math.floor(min(s[3] for s in stations) / cell_deg) * cell_deg
+    lon0 = math.floor(min(s[4] for s in stations) / cell_deg) * cell_deg
+    rows = int((max(s[3] for s in stations) - lat0) // cell_deg) + 1
+    cols = int((max(s[4] for s in stations) - lon0) // cell_deg) + 1
+
+    buckets = [[] for _ in range(rows * cols)]
+    entries = 0
+    for index, (icao, _, _, lat, lon) in enumerate(stations):
+        if reporting is not None and icao not in reporting:
+            continue
+        entries += 1
+        row = int((lat - lat0) // cell_deg)
+        col = int((lon - lon0) // cell_deg)
+        buckets[row * cols + col].append((index, lat, lon))
+
+    with open(path, "wb") as f:
+        f.write(struct.pack(
+            station_grid.HEADER, station_grid.MAGIC, round(cell_deg * 100),
+            round(lat0 * 100), round(lon0 * 100), rows, cols, entries,
+        ))
+        offset = 0
+        for bucket in buckets:
+            f.write(struct.pack("<I", offset))
+            offset += len(bucket)
+        f.write(struct.pack("<I", offset))
+        for bucket in buckets:
+            for index, lat, lon in bucket:
+                f.write(struct.pack(
+                    station_grid.ENTRY, index,
+                    round(lat * COORD_SCALE), round(lon * COORD_SCALE),
+                ))
+    return rows, cols, entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("airports", help="CSV airport list")
+    parser.add_argument("output", nargs="?", default="stations.bin")
+    parser.add_argument("--cell", type=float, default=2.0,
+                        help="grid cell size in degrees (default 2)")
+    parser.add_argument("--metar-stations", metavar="FILE",
+                        help="list of stations that issue METARs, for Nearby Airports")
+    args = parser.parse_args(argv)
+
+    stations, reporting = read_stations(args.airports)
+    if args.metar_stations:
+        reporting = read_metar_stations(args.metar_stations)
+    if not stations:
+        sys.exit(f"No stations with ICAO codes found in {args.airports}")
+    write_index(stations, args.output)
+    size = len(stations) * RECORD_SIZE
+    print(f"Wrote {len(stations)} stations ({size} bytes) to {args.output}")
+
+    grid_path = os.path.join(os.path.dirname(args.output), station_grid.GRID_FILE)
+    rows, cols, entries = write_grid(stations, grid_path, args.cell, reporting)
+    print(f"Wrote {rows}x{cols} grid of {entries} reporting stations to {grid_path}")
+
+
+if __name__ == "__main__":
+    main()
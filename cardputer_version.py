@@ -5,10 +5,12 @@
 from machine import SPI, Pin, RTC
 from lib import st7789py, keyboard
 import network
-import urequests
 import socket
 import struct
 import time
+import endpoint_cache
+import http_client
+import station_index
 
 # Replace with your WiFi credentials
 WIFI_SSID = 'YOUR_SSID'
@@ -130,53 +132,95 @@ def select_station():
             return None
         time.sleep(0.05)
 
+_station_index = None
+
+def get_station_index():
+    """Open stations.bin once; None when no index is on the device."""
+    global _station_index
+    if _station_index is None:
+        _station_index = station_index.open_index() or False
+    return _station_index or None
+
 def enter_airport():
-    characters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    code = ["K", "A", "A", "A"]
-    pos = 0
-    char_index = 0
+    """Type an ICAO code directly or pick characters with up/down.
+
+    The characters that can come next are listed under the code.  With a
+    station index only characters that continue a known code are accepted,
+    so a complete code always exists, and the best matches are listed too.
+    """
+    completer = station_index.Completer(get_station_index())
+    char_index = completer.start()
+    matches = None
     last_blink = time.ticks_ms()
     cursor_visible = True
-    while pos < 4:
+    while True:
         if time.ticks_diff(time.ticks_ms(), last_blink) > 500:
             cursor_visible = not cursor_visible
             last_blink = time.ticks_ms()
-        current = ''.join(code)
-        cursor = current[:pos] + ('_' if cursor_visible else current[pos]) + current[pos+1:]
-        display_text([f"Enter Airport: {cursor}"])
+        choices = completer.choices
+        candidate = choices[char_index] if choices else ""
+        if matches is None:
+            matches = completer.matches(candidate)
+        cursor = completer.prefix + ('_' if cursor_visible and candidate else candidate)
+        lines = [f"Enter Airport: {cursor}"]
+        if choices:
+            lines.append("Next: " + choices[char_index:] + choices[:char_index])
+        for st in matches:
+            lines.append(f"{st['icao']} {st['state']} {st['name']}")
+        display_text(lines)
         keys = KB.get_pressed_keys()
-        if KEY_UP in keys:
-            char_index = (char_index - 1) % len(characters)
-            code[pos] = characters[char_index]
+        typed = [k.upper() for k in keys if len(k) == 1 and k.upper() in choices]
+        if typed:
+            completer.push(typed[0])
+            char_index = completer.start()
+            matches = None
             time.sleep(0.1)
-        elif KEY_DOWN in keys:
-            char_index = (char_index + 1) % len(characters)
-            code[pos] = characters[char_index]
+        elif KEY_UP in keys and choices:
+            char_index = (char_index - 1) % len(choices)
+            matches = None
+            time.sleep(0.1)
+        elif KEY_DOWN in keys and choices:
+            char_index = (char_index + 1) % len(choices)
+            matches = None
             time.sleep(0.1)
         elif KEY_SELECT in keys:
-            pos += 1
-            char_index = 0
+            if completer.is_complete():
+                return completer.prefix
+            completer.push(candidate)
+            char_index = completer.start()
+            matches = None
             time.sleep(0.1)
-        elif KEY_BACK in keys and pos > 0:
-            pos -= 1
-            char_index = characters.index(code[pos])
+        elif KEY_BACK in keys:
+            if not completer.prefix:
+                return None
+            completer.pop()
+            char_index = completer.start()
+            matches = None
             time.sleep(0.1)
         time.sleep(0.05)
-    return ''.join(code)
 
 # ---- METAR retrieval and display ----
 
+METAR_URL = "https://tgftp.nws.noaa.gov/data/observations/metar/stations/{station}.TXT"
+FETCH_BUDGET_MS = 10000
+
 def fetch_metar_data(station):
-    url = f"https://tgftp.nws.noaa.gov/data/observations/metar/stations/{station}.TXT"
     headers = {"User-Agent": "Cardputer-METAR/1.0", "Accept": "text/plain"}
+    deadline = http_client.Deadline(FETCH_BUDGET_MS)
     try:
-        resp = urequests.get(url, headers=headers)
-        if resp.status_code == 200:
-            data = resp.text.strip().split('\n')
-            resp.close()
-            return '\n'.join([l for l in data if l])
-    except Exception:
-        pass
+        resp = endpoint_cache.open_endpoint(
+            METAR_URL, station, lambda url: http_client.get(url, headers, deadline)
+        )
+        if resp is not None:
+            with resp:
+                if resp.status_code == 200:
+                    data = http_client.read_text(resp, deadline).strip().split('\n')
+                    return '\n'.join([l for l in data if l])
+    except Exception as e:
+        print(f"METAR fetch failed: {e}")
+    finally:
+        print(f"METAR timing: {deadline.report()}")
+        print(f"HTTP: {http_client.report()}")
     return None
 
 def get_current_utc():
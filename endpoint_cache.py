@@ -0,0 +1,206 @@
+# Per-endpoint protocol capability cache.
+#
+# Some NOAA feeds only answer over HTTPS while others only allow plain HTTP,
+# and a few redirect from one to the other.  Instead of guessing on every
+# fetch we probe each endpoint once, remember which scheme/host/redirect
+# worked and keep that on flash so the next boot goes straight to it.
+#
+# An optional OVERRIDES_FILE maps host names to another base URL, e.g.
+#   {"tgftp.nws.noaa.gov": "http://192.168.1.20:8080"}
+# to send every request for that host to a local test server
+# (standin_server.py) instead.  Overridden hosts skip the probing.
+#
+# The other variants are only tried when the failure could be down to the
+# scheme: a refused connection, a TLS error, a redirect or an error status
+# other than 5xx.  A timeout or a 5xx means the host itself is in trouble,
+# and probing every variant would only triple the requests during an
+# outage; the deadline running out ends the attempt altogether.
+
+import json
+
+import http_client
+
+CACHE_FILE = "endpoint_cache.json"
+OVERRIDES_FILE = "endpoint_overrides.json"
+MAX_REDIRECTS = 3
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+ETIMEDOUT = 110
+
+_cache = None
+_overrides = None
+
+
+def _load():
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_FILE, "r") as f:
+                _cache = json.load(f)
+        except Exception:
+            _cache = {}
+    return _cache
+
+
+def _load_overrides():
+    global _overrides
+    if _overrides is None:
+        try:
+            with open(OVERRIDES_FILE, "r") as f:
+                _overrides = json.load(f)
+            print(f"Endpoint overrides: {_overrides}")
+        except Exception:
+            _overrides = {}
+    return _overrides
+
+
+def _save():
+    try:
+        with open(CACHE_FILE, "w") as f:
+            json.dump(_cache, f)
+    except Exception as e:
+        print(f"Endpoint cache write error: {e}")
+
+
+def _split(template):
+    """Split a URL into its scheme://host/path part and its query string."""
+    i = template.find("?")
+    return (template, "") if i < 0 else (template[:i], template[i:])
+
+
+def _key(template):
+    """Cache key for an endpoint: host and path, without scheme or query."""
+    return _split(template)[0].split("://", 1)[-1]
+
+
+def _with_scheme(template, scheme):
+    return scheme + "://" + _key(template)
+
+
+def override(template):
+    """``template`` redirected by the overrides file, or None."""
+    overrides = _load_overrides()
+    if not overrides:
+        return None
+    rest = template.split("://", 1)[-1]
+    host, slash, path = rest.partition("/")
+    base = overrides.get(host.split(":")[0])
+    if base is None:
+        return None
+    return base.rstrip("/") + slash + path
+
+
+def lookup(template):
+    """Return the remembered working base URL for ``template`` or None."""
+    return _load().get(_key(template))
+
+
+def remember(template, working):
+    """Record ``working`` as the variant to use for ``template``."""
+    cache = _load()
+    key = _key(template)
+    working = _split(working)[0]
+    if cache.get(key) != working:
+        cache[key] = working
+        _save()
+
+
+def forget(template):
+    cache = _load()
+    if cache.pop(_key(template), None) is not None:
+        _save()
+
+
+def candidates(template):
+    """Templates to try, cheapest first.
+
+    An overridden host only gets its override.  Otherwise a remembered
+    variant always comes first, then plain HTTP is tried before HTTPS so
+    feeds that allow it don't pay for a TLS handshake; feeds that redirect
+    to HTTPS are remembered at their final location.
+    """
+    redirected = override(template)
+    if redirected:
+        return [redirected]
+    query = _split(template)[1]
+    result = []
+    cached = lookup(template)
+    if cached:
+        result.append(cached + query)
+    for scheme in ("http", "https"):
+        variant = _with_scheme(template, scheme) + query
+        if variant not in result:
+            result.append(variant)
+    return result
+
+
+def _as_template(url, station):
+    """Turn a concrete redirect target back into a template."""
+    if station and station in url:
+        return url.replace(station, "{station}")
+    return url
+
+
+def _location(response):
+    headers = getattr(response, "headers", None) or {}
+    for name in ("Location", "location"):
+        if name in headers:
+            return headers[name]
+    return None
+
+
+def _timed_out(error):
+    if not isinstance(error, OSError):
+        return False
+    return error.args[:1] == (ETIMEDOUT,) or "timed out" in str(error)
+
+
+def open_endpoint(template, station, request):
+    """Open ``template`` using the first variant that works.
+
+    ``request`` is called with a concrete URL and must return a response
+    object with ``status_code`` and ``close()``.  The returned response is
+    still open and owned by the caller.  A 200 answer records the variant
+    that produced it; 404 is passed back as-is since it means the endpoint
+    works but the station has no data, and so are 304 (not modified) for a
+    conditional request and 5xx.  Returns None when nothing worked, or as
+    soon as a variant times out.  http_client.DeadlineExceeded is raised
+    through.
+    """
+    for variant in candidates(template):
+        url = variant.format(station=station or "")
+        response = None
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                response = request(url)
+                status = response.status_code
+                if status in REDIRECT_CODES:
+                    target = _location(response)
+                    response.close()
+                    response = None
+                    if not target:
+                        break
+                    print(f"Redirected to {target}")
+                    url = target
+                    variant = _as_template(target, station)
+                    continue
+                if status == 200:
+                    if not override(template):
+                        remember(template, variant)
+                    return response
+                if status in (304, 404) or status >= 500:
+                    # Answered over this scheme; another variant won't help
+                    return response
+                print(f"HTTP error {status} from {url}")
+                response.close()
+                break
+        except http_client.DeadlineExceeded:
+            if response is not None:
+                response.close()
+            raise
+        except Exception as e:
+            print(f"Endpoint {url} failed: {e}")
+            if response is not None:
+                response.close()
+            if _timed_out(e):
+                return None
+    return None
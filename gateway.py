@@ -0,0 +1,316 @@
+"""Serve weather products to many displays from one upstream fetch.
+
+Run this on a computer on the same network as the displays (CPython):
+
+    python gateway.py --port 8081
+
+The gateway answers the same paths as the NOAA services, using the
+product definitions in ``products.weather_products``: a request for
+``/data/observations/metar/stations/KBNA.TXT`` or
+``/api/data/pirep?format=raw&id=KBNA...`` is fetched upstream through the
+same pipeline the Pico uses and kept for the product's CACHE_TTL_MS
+(or ``--ttl``).  Requests for the same feed within that time are served
+from memory, and only one upstream fetch runs for a feed at a time, so
+upstream traffic doesn't grow with the number of displays.  Answers carry
+an ETag and a request with a matching If-None-Match gets a 304.  When
+upstream fails, the last copy is served with an ``X-Stale`` header.
+
+Point the displays at it with an ``endpoint_overrides.json`` next to their
+scripts:
+
+    {"tgftp.nws.noaa.gov": "http://192.168.1.20:8081",
+     "aviationweather.gov": "http://192.168.1.20:8081"}
+
+Don't put that file where the gateway itself runs, or it will fetch from
+itself.
+
+Displays that send an ``X-Wire-Width`` header get the product already
+cleaned, wrapped to that many characters and split into pages (see
+``wire_format.py``), built once per width for every display of that size.
+Products laid out by the clock (the TAF's current period) are laid out
+again every REPAGINATE_MS, and the ETag of a payload is the CRC of the
+payload itself, so displays get the new layout when it changes.
+``GET /_stats`` returns the request counters.
+
+METAR observation history (the trend lines under a METAR) is only kept
+with ``--history DIR``; otherwise the gateway writes no files.
+"""
+
+import argparse
+import binascii
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import hostshims
+
+hostshims.install()
+
+import http_client  # noqa: E402
+import metar_decode  # noqa: E402
+import obs_history  # noqa: E402
+import products  # noqa: E402
+import wire_format  # noqa: E402
+from products import weather_products  # noqa: E402
+
+
+def routes():
+    """``(path prefix, path suffix, product, upstream base)`` per product.
+
+    Station products match ``prefix<ICAO>suffix``; area products match
+    their path exactly (the suffix is None).
+    """
+    result = []
+    for name, info in weather_products.items():
+        url = info["url"].split("?", 1)[0]
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        base = f"{scheme}://{host}"
+        path = "/" + path
+        if "{station}" in path:
+            prefix, _, suffix = path.partition("{station}")
+            result.append((prefix, suffix, name, base))
+        else:
+            result.append((path, None, name, base))
+    return result
+
+
+def utc_clock():
+    now = datetime.now(timezone.utc)
+    return now.day, now.hour, now.minute
+
+
+def wire_payload(name, text, station, width):
+    """``text`` laid out for ``width`` characters per line, as a payload."""
+    pages = products.paginate(name, text, lambda line: wire_format.wrap_words(line, width),
+                              utc_clock, station)
+    laid_out = [list(pages[i]) for i in range(len(pages))]
+    jumps = None
+    if hasattr(pages, "next_mention"):
+        jumps = []
+        for i in range(len(laid_out)):
+            target = pages.next_mention(i)
+            jumps.append(-1 if target is None else target)
+    fields = None
+    if name == "METAR":
+        report = metar_decode.find_report(text, station)
+        fields = metar_decode.decode(report) if report else None
+    return wire_format.encode(laid_out, width, fields, jumps)
+
+
+def layout_period(name):
+    """Number of the REPAGINATE_MS period we are in; 0 for products whose
+    layout doesn't depend on the clock."""
+    every = products.load(name).REPAGINATE_MS
+    return int(time.time() * 1000) // every if every else 0
+
+
+class Entry:
+    def __init__(self, name, text, station, ttl_s):
+        self.name = name
+        self.text = text
+        self.station = station
+        self.body = text.encode()
+        self.etag = '"%08x"' % (binascii.crc32(self.body) & 0xFFFFFFFF)
+        self.fetched = time.monotonic()
+        self.ttl_s = ttl_s
+        # width -> (payload, etag, layout period)
+        self.wire = {}
+
+    def age_s(self):
+        return time.monotonic() - self.fetched
+
+    def fresh(self):
+        return self.age_s() < self.ttl_s
+
+
+class Gateway:
+    def __init__(self, ttl_s=None):
+        self.routes = routes()
+        self.ttl_s = ttl_s
+        self.cache = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        # The fetch pipeline keeps per-fetch state in module globals, so
+        # upstream fetches for different feeds take turns
+        self.fetch_lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "upstream": 0, "not_modified": 0,
+                      "stale": 0, "errors": 0, "layouts": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def match(self, path_qs):
+        """``(product, upstream URL, station)`` for a request, or None."""
+        path, _, query = path_qs.partition("?")
+        for prefix, suffix, name, base in self.routes:
+            if suffix is None:
+                if path != prefix:
+                    continue
+                station = None
+                for pair in query.split("&"):
+                    if pair.startswith("id="):
+                        station = pair[3:]
+            else:
+                if not (path.startswith(prefix) and path.endswith(suffix)):
+                    continue
+                station = path[len(prefix):len(path) - len(suffix)]
+                if not station or "/" in station:
+                    continue
+            return name, base + path_qs, station
+        return None
+
+    def _key_lock(self, key):
+        with self.lock:
+            lock = self.locks.get(key)
+            if lock is None:
+                lock = self.locks[key] = threading.Lock()
+            return lock
+
+    def get(self, path_qs):
+        """``(entry, stale)`` for a request; entry is None when unknown or
+        nothing could be fetched."""
+        route = self.match(path_qs)
+        if route is None:
+            return None, False
+        name, url, station = route
+        entry = self.cache.get(path_qs)
+        if entry is not None and entry.fresh():
+            self.count("hits")
+            return entry, False
+        # One upstream fetch per feed; other requests wait for its result
+        with self._key_lock(path_qs):
+            entry = self.cache.get(path_qs)
+            if entry is not None and entry.fresh():
+                self.count("hits")
+                return entry, False
+            self.count("upstream")
+            info = weather_products[name]
+            deadline = http_client.Deadline(info.get("budget_ms", http_client.DEFAULT_BUDGET_MS))
+            try:
+                with self.fetch_lock:
+                    text = products.fetch(name, url, station, deadline)
+            except Exception as e:
+                print(f"Upstream {url} failed: {e}")
+                text = None
+            print(f"{name} {url}: {deadline.report()}")
+            if text is None:
+                return entry, entry is not None
+            ttl_s = self.ttl_s
+            if ttl_s is None:
+                ttl_s = products.load(name).CACHE_TTL_MS / 1000
+            entry = Entry(name, text, station, ttl_s)
+            self.cache[path_qs] = entry
+            return entry, False
+
+    def wire(self, entry, width):
+        """``(payload, etag)`` of ``entry`` laid out ``width`` characters wide."""
+        period = layout_period(entry.name)
+        laid_out = entry.wire.get(width)
+        if laid_out is None or laid_out[2] != period:
+            # Pagination keeps per-product state too
+            with self.fetch_lock:
+                laid_out = entry.wire.get(width)
+                if laid_out is None or laid_out[2] != period:
+                    self.count("layouts")
+                    body = wire_payload(entry.name, entry.text, entry.station, width)
+                    # The layout can change while the text doesn't (the
+                    # TAF's current period), so the tag follows the payload
+                    etag = '"%08x-w%d"' % (binascii.crc32(body) & 0xFFFFFFFF, width)
+                    laid_out = entry.wire[width] = (body, etag, period)
+        return laid_out[:2]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gateway = None
+
+    def log_message(self, fmt, *args):
+        print(f"{self.address_string()} {fmt % args}")
+
+    def _empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        gateway = self.gateway
+        if self.path == "/_stats":
+            body = json.dumps(gateway.stats).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        gateway.count("requests")
+        entry, stale = gateway.get(self.path)
+        if entry is None:
+            gateway.count("errors")
+            known = gateway.match(self.path) is not None
+            self._empty(502 if known else 404)
+            return
+        if stale:
+            gateway.count("stale")
+        body, etag, content_type = entry.body, entry.etag, "text/plain"
+        width = self.headers.get(wire_format.WIDTH_HEADER)
+        if width and width.isdigit() and 0 < int(width) < 256:
+            try:
+                body, etag = gateway.wire(entry, int(width))
+                content_type = wire_format.CONTENT_TYPE
+            except Exception as e:
+                # The display can lay out the text itself
+                print(f"Layout of {self.path} failed: {e}")
+        max_age = max(int(entry.ttl_s - entry.age_s()), 0)
+        headers = [("ETag", etag), ("Cache-Control", f"max-age={max_age}"),
+                   ("Vary", wire_format.WIDTH_HEADER)]
+        if stale:
+            headers.append(("X-Stale", str(int(entry.age_s()))))
+        if self.headers.get("If-None-Match") == etag:
+            gateway.count("not_modified")
+            self._empty(304, headers)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--ttl", type=float,
+                        help="seconds to keep every feed (default: each product's CACHE_TTL_MS)")
+    parser.add_argument("--history", metavar="DIR",
+                        help="keep METAR history files (for trends) in DIR (default: none)")
+    args = parser.parse_args(argv)
+
+    # The METAR pipeline records each station's observations; only keep
+    # them when asked where
+    if args.history:
+        os.makedirs(args.history, exist_ok=True)
+    obs_history.DIRECTORY = args.history
+    Handler.gateway = Gateway(args.ttl)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Gateway on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Keeping the heap in one piece over long uptimes.
+#
+# MicroPython's heap never moves objects, so long-lived data allocated in
+# between short-lived strings leaves holes, and after hours an 8 KB fetch
+# buffer can fail with plenty of memory free in total.  To avoid that:
+#
+#   - the big buffers are reserved once at boot (``reserve``) and handed out
+#     again for every fetch (``buffer``) instead of being allocated each time
+#   - strings that are kept (station codes, product names, cache keys) are
+#     interned, so each is stored once
+#   - garbage is collected at frame boundaries (``frame``) and right before
+#     long-lived data such as a product's pages is built (``collect``), so
+#     that data goes into the holes left by garbage, not above it
+#   - ``largest_block`` probes the biggest allocation that still succeeds;
+#     ``check`` logs it now and then so a shrinking figure shows up early.
+#     The probe briefly takes nearly all free memory, so it must not run
+#     while the network worker on the other core may be allocating
+#
+# On CPython (gateway, soak test) the gc calls that don't exist are skipped
+# and the figures are None.
+
+import gc
+import time
+
+# Collect at a frame boundary once this much was allocated since the last
+# collection
+FRAME_GC_BYTES = 16384
+# Automatic collections only for bursts bigger than this share of the heap
+THRESHOLD_SHARE = 4
+# Resolution of the largest-block probe
+PROBE_STEP = 512
+PROBE_MS = 600000
+
+_buffers = {}
+_strings = {}
+_last_alloc = 0
+_last_probe = None
+
+stats = {"collections": 0, "reused": 0, "allocated": 0,
+         "largest": None, "largest_low": None}
+
+
+def free():
+    """Free heap in bytes, or None where it can't be measured."""
+    mem_free = getattr(gc, "mem_free", None)
+    return mem_free() if mem_free else None
+
+
+def allocated():
+    mem_alloc = getattr(gc, "mem_alloc", None)
+    return mem_alloc() if mem_alloc else None
+
+
+def collect():
+    """Collect now, e.g. right before building long-lived data."""
+    global _last_alloc
+    gc.collect()
+    stats["collections"] += 1
+    _last_alloc = allocated() or 0
+
+
+def setup(buffers=()):
+    """Call once at boot: reserve ``(name, size)`` buffers and set the
+    automatic collection threshold."""
+    collect()
+    for name, size in buffers:
+        reserve(name, size)
+    threshold = getattr(gc, "threshold", None)
+    total = free()
+    if threshold is not None and total is not None:
+        threshold(total // THRESHOLD_SHARE)
+    check(force=True)
+
+
+def reserve(name, size):
+    """Allocate buffer ``name`` now, while the heap is still in one piece."""
+    current = _buffers.get(name)
+    if current is None or len(current) < size:
+        _buffers[name] = None
+        collect()
+        _buffers[name] = bytearray(size)
+        stats["allocated"] += 1
+    return _buffers[name]
+
+
+def has_buffer(name, size):
+    current = _buffers.get(name)
+    return current is not None and len(current) >= size
+
+
+def buffer(name, size):
+    """The reserved buffer ``name``, at least ``size`` bytes long.
+
+    It is the same object every time, so whatever used it last must be
+    done with it: one fetch at a time.  A buffer that is too small, or was
+    never reserved, is replaced and kept for next time.
+    """
+    if has_buffer(name, size):
+        stats["reused"] += 1
+        return _buffers[name]
+    return reserve(name, size)
+
+
+def intern(text):
+    """One shared copy of a string that is kept around."""
+    if text is None:
+        return None
+    return _strings.setdefault(text, text)
+
+
+def frame(probe=True):
+    """Call once per displayed frame, after the display update.
+
+    Pass ``probe=False`` while another core may be allocating; the
+    largest-block check then waits for a later frame.
+    """
+    alloc = allocated()
+    if alloc is not None and alloc - _last_alloc >= FRAME_GC_BYTES:
+        collect()
+    if probe:
+        check()
+
+
+def largest_block(limit=None):
+    """Size of the largest allocation that succeeds now, to PROBE_STEP."""
+    total = free()
+    if total is None:
+        return None
+    gc.collect()
+    low, high = 0, (limit or total) // PROBE_STEP
+    while low < high:
+        mid = (low + high + 1) // 2
+        try:
+            # Allocated and dropped straight away
+            bytearray(mid * PROBE_STEP)
+            low = mid
+        except MemoryError:
+            high = mid - 1
+    return low * PROBE_STEP
+
+
+def check(force=False):
+    """Probe the largest block every PROBE_MS and log it with the low mark."""
+    global _last_probe
+    now = time.ticks_ms()
+    if not force and _last_probe is not None and time.ticks_diff(now, _last_probe) < PROBE_MS:
+        return
+    _last_probe = now
+    largest = largest_block()
+    if largest is None:
+        return
+    stats["largest"] = largest
+    if stats["largest_low"] is None or largest < stats["largest_low"]:
+        stats["largest_low"] = largest
+    print(f"Heap: free {free()}, largest block {largest} (lowest {stats['largest_low']}), "
+          f"{stats['collections']} collections")
@@ -0,0 +1,253 @@
+# Stand-ins for MicroPython-only modules so the device code can run on a PC.
+#
+# ``install()`` adds the ``time.ticks_*`` functions (with MicroPython's
+# wrap-around) to CPython's time module and registers a small ``urequests``
+# built on http.client.  Nothing is replaced if the real thing is present,
+# so importing this on the device is harmless.
+#
+# ``install_hardware()`` also registers stand-ins for the board modules
+# (picographics, pimoroni, machine, network), so pico_version.py itself can
+# be imported and run, e.g. by soak.py.  Buttons are pressed with
+# ``press()`` and the RTC follows ``wall_time``, which can be swapped for a
+# virtual or drifting clock.
+
+import calendar
+import sys
+import time
+import types
+
+TICKS_PERIOD = 1 << 30
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) % TICKS_PERIOD
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALF) % TICKS_PERIOD) - TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+class HostRaw:
+    """Socket-like view of a response body (``read`` and ``settimeout``)."""
+
+    def __init__(self, response, sock):
+        self._response = response
+        self._sock = sock
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._response.read()
+        # Like a socket read: whatever has arrived, up to ``size`` bytes
+        return self._response.read1(size)
+
+    def settimeout(self, seconds):
+        if self._sock is not None:
+            self._sock.settimeout(seconds)
+
+
+class HostResponse:
+    """The parts of a urequests Response the device code uses."""
+
+    def __init__(self, connection, response):
+        self._connection = connection
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = dict(response.getheaders())
+        self.raw = HostRaw(response, connection.sock)
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read()
+        return self._content
+
+    @property
+    def text(self):
+        return str(self.content, "utf-8")
+
+    def close(self):
+        self._connection.close()
+
+
+class HostRequests:
+    """``urequests`` module replacement; redirects are not followed."""
+
+    @staticmethod
+    def get(url, headers=None, timeout=None, **kwargs):
+        import http.client
+
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(host, timeout=timeout)
+        else:
+            connection = http.client.HTTPConnection(host, timeout=timeout)
+        try:
+            connection.request("GET", "/" + path, headers=headers or {})
+            return HostResponse(connection, connection.getresponse())
+        except Exception:
+            connection.close()
+            raise
+
+
+# Seconds since the epoch as seen by the RTC stand-in
+wall_time = time.time
+
+
+class Display:
+    """PicoGraphics stand-in that keeps the text of the frame being drawn."""
+
+    def __init__(self, display=None, pen_type=None, rotate=0, width=240, height=135):
+        self.width = width
+        self.height = height
+        self.lines = []
+        self.frame = []
+        self.frames = 0
+
+    def get_bounds(self):
+        return self.width, self.height
+
+    def create_pen(self, r, g, b):
+        return (r << 16) | (g << 8) | b
+
+    def set_pen(self, pen):
+        pass
+
+    def set_font(self, font):
+        pass
+
+    def clear(self):
+        self.lines = []
+
+    def text(self, text, x, y, wordwrap=None, scale=None, *args):
+        self.lines.append(text)
+
+    def update(self):
+        self.frame = self.lines
+        self.frames += 1
+
+
+# pin -> time.ticks_ms() value until which the button is held down
+_held = {}
+
+
+def press(pin, hold_ms=150):
+    """Hold the button on ``pin`` down for ``hold_ms``."""
+    _held[pin] = time.ticks_add(time.ticks_ms(), hold_ms)
+
+
+class Button:
+    def __init__(self, pin, *args, **kwargs):
+        self.pin = pin
+
+    def read(self):
+        until = _held.get(self.pin)
+        return until is not None and time.ticks_diff(until, time.ticks_ms()) > 0
+
+    def is_pressed(self):
+        return self.read()
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+
+    def __init__(self, pin, *args, **kwargs):
+        self.pin = pin
+
+    def value(self, *args):
+        return 1
+
+
+class RTC:
+    """RTC whose time runs with ``wall_time``; setting it stores an offset."""
+    _offset = 0
+
+    def datetime(self, value=None):
+        if value is None:
+            t = time.gmtime(wall_time() + RTC._offset)
+            return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour, t.tm_min, t.tm_sec, 0)
+        year, month, day, _, hour, minute, second = value[:7]
+        target = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+        RTC._offset = target - wall_time()
+
+
+def rtc_time():
+    """The RTC stand-in's time in seconds since the epoch."""
+    return wall_time() + RTC._offset
+
+
+class WLAN:
+    def __init__(self, interface=0):
+        self._active = False
+
+    def active(self, value=None):
+        if value is not None:
+            self._active = value
+        return self._active
+
+    def connect(self, ssid, password=None):
+        self._active = True
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self):
+        return True
+
+    def scan(self):
+        return []
+
+    def status(self):
+        return 3
+
+    def ifconfig(self):
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    for key, value in attrs.items():
+        setattr(module, key, value)
+    return module
+
+
+def install_hardware():
+    """Register the board modules pico_version.py and friends import."""
+    modules = {
+        "picographics": _module("picographics", PicoGraphics=Display,
+                                DISPLAY_PICO_DISPLAY=0, PEN_RGB332=0),
+        "pimoroni": _module("pimoroni", Button=Button),
+        "machine": _module("machine", RTC=RTC, Pin=Pin),
+        "network": _module("network", WLAN=WLAN, STA_IF=0, AP_IF=1),
+    }
+    for name, module in modules.items():
+        if name not in sys.modules:
+            try:
+                __import__(name)
+            except ImportError:
+                sys.modules[name] = module
+
+
+def install():
+    """Make the MicroPython APIs used by the device code available."""
+    for name in ("ticks_ms", "ticks_diff", "ticks_add", "sleep_ms"):
+        if not hasattr(time, name):
+            setattr(time, name, globals()[name])
+    if "urequests" not in sys.modules:
+        try:
+            # Only to see whether a real one is installed
+            __import__("urequests")
+        except ImportError:
+            sys.modules["urequests"] = HostRequests
@@ -0,0 +1,210 @@
+# HTTP GET with a hard total deadline.
+#
+# Every request gets one time budget that is split across DNS lookup,
+# connect (including the TLS handshake and response headers) and body
+# reads.  Connect and read limits are applied as socket timeouts so a
+# stalled server or half-open TLS connection can't hang the device; the
+# remaining budget is checked between phases and between body chunks.
+#
+# Responses come back wrapped in Response, which counts the sockets opened
+# and closed.  Use one as a context manager so it is closed on every path;
+# any left open past LEAK_MS are counted as leaks and closed by ``reap`` so
+# a bug can't slowly use up the socket pool.
+
+import time
+import socket
+import urequests
+
+DEFAULT_BUDGET_MS = 15000
+# Percentage of the total budget each phase may use.  Body reads get
+# whatever is left when they start.
+PHASE_SHARES = {"dns": 20, "connect": 50}
+# A response open this long has been forgotten by its caller
+LEAK_MS = 60000
+
+stats = {"opened": 0, "closed": 0, "failed": 0, "leaked": 0}
+# id -> Response, for every response not yet closed
+_open = {}
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, phase, deadline):
+        super().__init__(f"{phase} overran {deadline.budget_ms}ms budget ({deadline.report()})")
+        self.phase = phase
+        self.timings = deadline.timings
+
+
+class Deadline:
+    """Total time budget for one request, with per-phase timings in ms."""
+
+    def __init__(self, budget_ms=DEFAULT_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.start = time.ticks_ms()
+        self.timings = {}
+        self._phase = None
+        self._phase_start = 0
+
+    def elapsed_ms(self):
+        return time.ticks_diff(time.ticks_ms(), self.start)
+
+    def remaining_ms(self):
+        return max(0, self.budget_ms - self.elapsed_ms())
+
+    def begin(self, phase):
+        self._phase = phase
+        self._phase_start = time.ticks_ms()
+
+    def end(self):
+        if self._phase is not None:
+            spent = time.ticks_diff(time.ticks_ms(), self._phase_start)
+            self.timings[self._phase] = self.timings.get(self._phase, 0) + spent
+            self._phase = None
+
+    def check(self, phase):
+        if self.remaining_ms() <= 0:
+            self.end()
+            raise DeadlineExceeded(phase, self)
+
+    def timeout_s(self, phase):
+        """Socket timeout in seconds for ``phase``, capped by what's left."""
+        self.check(phase)
+        ms = self.remaining_ms()
+        share = PHASE_SHARES.get(phase)
+        if share is not None:
+            ms = min(ms, self.budget_ms * share // 100)
+        return max(ms, 1) / 1000
+
+    def report(self):
+        parts = [f"{k} {v}ms" for k, v in self.timings.items()]
+        parts.append(f"total {self.elapsed_ms()}ms")
+        return ", ".join(parts)
+
+
+class Response:
+    """A urequests response whose socket is counted and closed only once."""
+
+    def __init__(self, response, url):
+        self.response = response
+        self.url = url
+        self.opened = time.ticks_ms()
+        self.closed = False
+        stats["opened"] += 1
+        _open[id(self)] = self
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        _open.pop(id(self), None)
+        stats["closed"] += 1
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_count():
+    """Responses opened and not closed yet."""
+    return len(_open)
+
+
+def reap(max_age_ms=LEAK_MS):
+    """Close responses left open longer than ``max_age_ms``; returns how many."""
+    now = time.ticks_ms()
+    leaked = [r for r in _open.values() if time.ticks_diff(now, r.opened) > max_age_ms]
+    for response in leaked:
+        print(f"Closing leaked response for {response.url}")
+        stats["leaked"] += 1
+        try:
+            response.close()
+        except Exception as e:
+            print(f"Closing leaked response failed: {e}")
+    return len(leaked)
+
+
+def report():
+    return (f"sockets open {len(_open)}, opened {stats['opened']}, closed {stats['closed']}, "
+            f"failed {stats['failed']}, leaked {stats['leaked']}")
+
+
+def _host_port(url):
+    scheme, _, rest = url.partition("://")
+    host = rest.split("/", 1)[0]
+    port = 443 if scheme == "https" else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return host, port
+
+
+def get(url, headers=None, deadline=None):
+    """Open ``url`` within ``deadline`` as a Response.
+
+    The caller must close it, preferably with ``with get(...) as response:``.
+    """
+    if deadline is None:
+        deadline = Deadline()
+    host, port = _host_port(url)
+
+    # Resolve up front so DNS time is measured separately; lwIP caches the
+    # result so the lookup inside urequests is then immediate.
+    deadline.check("dns")
+    deadline.begin("dns")
+    try:
+        socket.getaddrinfo(host, port)
+    finally:
+        deadline.end()
+    deadline.check("dns")
+
+    deadline.begin("connect")
+    try:
+        response = Response(urequests.get(url, headers=headers or {}, timeout=deadline.timeout_s("connect")), url)
+    except Exception:
+        # urequests closes its own socket when it fails
+        stats["failed"] += 1
+        raise
+    finally:
+        deadline.end()
+    if deadline.remaining_ms() <= 0:
+        response.close()
+        raise DeadlineExceeded("connect", deadline)
+    return response
+
+
+def arm_read(response, deadline):
+    """Limit the next body read to the time left in ``deadline``."""
+    raw = getattr(response, "raw", None)
+    if raw is not None and hasattr(raw, "settimeout"):
+        raw.settimeout(deadline.timeout_s("read"))
+
+
+def read_chunks(response, deadline, chunk_size=1024):
+    """Yield body chunks, aborting with DeadlineExceeded when time runs out."""
+    deadline.begin("read")
+    try:
+        while True:
+            arm_read(response, deadline)
+            chunk = response.raw.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        deadline.end()
+
+
+def read_text(response, deadline):
+    """Read the whole body as text within ``deadline``."""
+    deadline.begin("read")
+    try:
+        arm_read(response, deadline)
+        text = response.text
+    finally:
+        deadline.end()
+    deadline.check("read")
+    return text
@@ -0,0 +1,116 @@
+# Decode the numeric fields of a METAR report.
+#
+# Only what the history and trend lines need is picked out: observation
+# time, wind, visibility, ceiling, temperature, dew point and altimeter.
+# Everything is an int so a decoded report packs straight into a fixed
+# record (see obs_history.py); a field that isn't reported is MISSING.
+
+MISSING = -32768
+
+# Order of the values returned by ``decode``
+FIELDS = ("time", "wdir", "wspd", "gust", "vis", "ceil", "temp", "dew", "alt")
+
+
+def _temp(text):
+    """"M05" -> -5, "12" -> 12."""
+    if not text:
+        return MISSING
+    negative = text[0] == "M"
+    if negative:
+        text = text[1:]
+    if not text.isdigit():
+        return MISSING
+    return -int(text) if negative else int(text)
+
+
+def _fraction(text):
+    """"1/2" -> 0.5 (None when it isn't a fraction)."""
+    top, _, bottom = text.partition("/")
+    if top.isdigit() and bottom.isdigit() and int(bottom):
+        return int(top) / int(bottom)
+    return None
+
+
+def decode(report):
+    """Decode one METAR line.
+
+    Returns a tuple in FIELDS order: time (minutes since the start of the
+    month), wind direction (degrees, 0 for variable), wind and gust speed
+    (knots), visibility (hundredths of a statute mile), ceiling (hundreds of
+    feet, the lowest BKN/OVC/VV layer), temperature and dew point (degrees
+    C) and altimeter (hundredths of inHg).  None when ``report`` has no
+    observation time.
+    """
+    values = [MISSING] * len(FIELDS)
+    words = report.split()
+    whole_miles = None
+    for i, word in enumerate(words):
+        if word == "RMK":
+            break
+        n = len(word)
+        if values[0] == MISSING and n == 7 and word[6] == "Z" and word[:6].isdigit():
+            day, hour, minute = int(word[0:2]), int(word[2:4]), int(word[4:6])
+            values[0] = ((day - 1) * 24 + hour) * 60 + minute
+        elif word.endswith("KT") and n >= 7 and (word[:3].isdigit() or word[:3] == "VRB"):
+            values[1] = 0 if word[:3] == "VRB" else int(word[:3])
+            speed, _, gust = word[3:-2].partition("G")
+            if speed.isdigit():
+                values[2] = int(speed)
+            if gust.isdigit():
+                values[3] = int(gust)
+        elif word.endswith("SM"):
+            text = word[:-2].lstrip("PM")
+            miles = _fraction(text)
+            if miles is None and text.isdigit():
+                miles = int(text)
+            if miles is not None:
+                if whole_miles is not None and "/" in text:
+                    miles += whole_miles
+                values[4] = int(miles * 100)
+        elif n == 4 and word.isdigit() and values[0] != MISSING and values[4] == MISSING:
+            # Metres, 9999 meaning 10 km or more
+            values[4] = int(int(word) * 100 / 1609)
+        elif word.isdigit() and n == 1 and i + 1 < len(words) and words[i + 1].endswith("SM"):
+            # "1 1/2SM"
+            whole_miles = int(word)
+        elif word[:3] in ("BKN", "OVC") and word[3:6].isdigit() or word[:2] == "VV" and word[2:5].isdigit():
+            height = int(word[3:6] if word[0] != "V" else word[2:5])
+            if values[5] == MISSING or height < values[5]:
+                values[5] = height
+        elif "/" in word and n <= 7 and word.replace("M", "").replace("/", "").isdigit():
+            temp, _, dew = word.partition("/")
+            values[6] = _temp(temp)
+            values[7] = _temp(dew)
+        elif n == 5 and word[0] == "A" and word[1:].isdigit():
+            values[8] = int(word[1:])
+        elif n == 5 and word[0] == "Q" and word[1:].isdigit():
+            # hPa to hundredths of inHg
+            values[8] = int(int(word[1:]) * 2.953 + 0.5)
+    if values[0] == MISSING:
+        return None
+    return tuple(values)
+
+
+def _is_ident(word):
+    """Four letters and digits, not all digits (MicroPython's str has no
+    isalnum)."""
+    if len(word) != 4 or word.isdigit():
+        return False
+    for c in word:
+        if not ("A" <= c <= "Z" or "0" <= c <= "9"):
+            return False
+    return True
+
+
+def find_report(text, station=None):
+    """The METAR line for ``station`` (or the first report) in ``text``."""
+    for line in text.split("\n"):
+        words = line.split()
+        if len(words) < 2:
+            continue
+        if words[0] in ("METAR", "SPECI"):
+            words = words[1:]
+        if _is_ident(words[0]):
+            if station is None or words[0] == station:
+                return " ".join(words)
+    return None
@@ -2,8 +2,8 @@ from machine import SPI, Pin, RTC
 from lib import st7789py, keyboard
 import time
 import network
-import urequests
 import gc
+import http_client
 from font import vga1_8x16 as font
 
 
@@ -131,13 +131,24 @@ def fetch_metar_data(selected_station):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
     }
-    response = urequests.get(url, headers=headers)
-    if response.status_code != 200:
-        # Handle HTTP errors or unsuccessful responses
-        print(f"Error fetching METAR data for {selected_station}: HTTP {response.status_code}")
+    deadline = http_client.Deadline(10000)
+    try:
+        response = http_client.get(url, headers, deadline)
+    except Exception as e:
+        print(f"Error fetching METAR data for {selected_station}: {e}")
         return "Error fetching data"
-    metar_data = response.text
-    response.close()
+    with response:
+        if response.status_code != 200:
+            # Handle HTTP errors or unsuccessful responses
+            print(f"Error fetching METAR data for {selected_station}: HTTP {response.status_code}")
+            return "Error fetching data"
+        try:
+            metar_data = http_client.read_text(response, deadline)
+        except http_client.DeadlineExceeded as e:
+            print(f"METAR read cancelled: {e}")
+            return "Error fetching data"
+    print(f"METAR timing: {deadline.report()}")
+    print(f"HTTP: {http_client.report()}")
     
     # Process the METAR data as before...
     metar_lines = metar_data.strip().split('\n')[3:]  # Skip header lines
@@ -0,0 +1,164 @@
+# Network worker for the Pico W's second core.
+#
+# TLS handshakes and socket reads can take seconds, and while they run on
+# the same core as the UI the display and buttons freeze.  With the worker
+# enabled, core 0 only posts jobs and collects results while core 1 does
+# the fetching, parsing and cleanup.  Jobs and results pass through two
+# small ring buffers, each guarded by a lock.
+#
+# Ownership: once submitted, a job's arguments belong to the worker; once
+# posted, a result belongs to the UI.  Neither side keeps or changes what it
+# has handed over, so the product text crosses between cores by reference
+# and is never copied.  Anything else shared between the cores (the product
+# modules, the last-good cache, the network stack) is only touched by the
+# UI while the worker is idle, see ``wait_idle``.
+
+import time
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+# Core 1's stack; TLS needs more than the default
+STACK_SIZE = 16384
+# How long the worker sleeps when there is nothing to do
+IDLE_SLEEP_MS = 20
+
+
+class Mailbox:
+    """Fixed-size ring of slots shared between the two cores."""
+
+    def __init__(self, size):
+        self.slots = [None] * size
+        self.head = 0
+        self.count = 0
+        self.lock = _thread.allocate_lock()
+
+    def __len__(self):
+        return self.count
+
+    def _push(self, item):
+        if self.count == len(self.slots):
+            return False
+        self.slots[(self.head + self.count) % len(self.slots)] = item
+        self.count += 1
+        return True
+
+    def _pop(self):
+        if not self.count:
+            return None
+        item = self.slots[self.head]
+        self.slots[self.head] = None
+        self.head = (self.head + 1) % len(self.slots)
+        self.count -= 1
+        return item
+
+    def put(self, item, overwrite=False):
+        """Add ``item``.  When full, drop the oldest item if ``overwrite``,
+        otherwise leave ``item`` with the caller and return False."""
+        with self.lock:
+            if overwrite and self.count == len(self.slots):
+                self._pop()
+            return self._push(item)
+
+    def get(self):
+        """Remove and return the oldest item, or None when empty."""
+        with self.lock:
+            return self._pop()
+
+    def has_key(self, key):
+        """True if an item whose first field is ``key`` is waiting."""
+        with self.lock:
+            for i in range(self.count):
+                if self.slots[(self.head + i) % len(self.slots)][0] == key:
+                    return True
+            return False
+
+    def clear(self):
+        with self.lock:
+            while self._pop() is not None:
+                pass
+
+
+class Worker:
+    """Runs ``func(*args)`` jobs on core 1 and posts ``(key, result)`` back."""
+
+    def __init__(self, jobs=4, results=4):
+        self.jobs = Mailbox(jobs)
+        self.results = Mailbox(results)
+        self.busy = False
+        self.running = False
+
+    def start(self):
+        """Start the worker thread; False when threads aren't available."""
+        if _thread is None:
+            return False
+        try:
+            _thread.stack_size(STACK_SIZE)
+        except Exception:
+            pass
+        try:
+            self.running = True
+            _thread.start_new_thread(self._run, ())
+            print("Network worker started on core 1")
+            return True
+        except Exception as e:
+            self.running = False
+            print(f"Network worker start error: {e}")
+            return False
+
+    def stop(self):
+        self.running = False
+
+    def submit(self, key, func, *args):
+        """Queue ``func(*args)``.  A job already queued under ``key`` is not
+        added twice.  Returns False when the queue is full."""
+        if self.jobs.has_key(key):
+            return True
+        return self.jobs.put((key, func, args))
+
+    def poll(self):
+        """Next ``(key, result)`` from the worker, or None."""
+        return self.results.get()
+
+    def idle(self):
+        with self.jobs.lock:
+            return not self.busy and not self.jobs.count
+
+    def wait_idle(self):
+        """Drop queued jobs and unread results and wait for the current job.
+
+        Call before the UI core touches shared state such as the network
+        stack or the product modules.
+        """
+        self.jobs.clear()
+        while not self.idle():
+            time.sleep(IDLE_SLEEP_MS / 1000)
+        self.results.clear()
+
+    def _next(self):
+        # Taking a job and marking the worker busy happen under one lock so
+        # ``idle`` never sees an empty queue while a job is in hand
+        with self.jobs.lock:
+            job = self.jobs._pop()
+            self.busy = job is not None
+            return job
+
+    def _run(self):
+        while self.running:
+            job = self._next()
+            if job is None:
+                time.sleep(IDLE_SLEEP_MS / 1000)
+                continue
+            key, func, args = job
+            job = None
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"Network worker job {key} error: {e}")
+                result = None
+            # Hand the result over; the worker keeps no reference to it
+            self.results.put((key, result), overwrite=True)
+            result = None
+            self.busy = False
@@ -0,0 +1,310 @@
+# Record and replay HTTP traffic.
+#
+# Recording wraps a urequests-style module and writes every exchange (URL,
+# status, headers, body chunks and how long each chunk took to arrive) to a
+# cassette file.  Replaying serves those exchanges back through the same
+# ``get()`` / ``response.raw.read()`` interface, so the fetch path and the
+# product parsers can be run and timed on a PC without any network.
+#
+# A cassette is a text file with one JSON object per line:
+#   {"url": ..., "status": 200, "headers": {...}, "connect_ms": 120,
+#    "chunks": [[delay_ms, base64 data], ...], "error": null}
+# "error" is set when the request or a body read failed; the replay raises
+# OSError at the same point.
+#
+# Usage (on a PC):
+#   python netreplay.py record metar.jsonl METAR KBNA
+#   python netreplay.py replay metar.jsonl METAR KBNA
+
+import json
+import time
+import binascii
+
+
+def _encode(data):
+    return str(binascii.b2a_base64(data), "ascii").strip()
+
+
+def _decode(text):
+    return binascii.a2b_base64(text)
+
+
+# Recording
+
+
+class RecordingRaw:
+    def __init__(self, exchange, raw):
+        self._exchange = exchange
+        self._raw = raw
+        self._last = time.ticks_ms()
+
+    def _add(self, data):
+        now = time.ticks_ms()
+        self._exchange["chunks"].append([time.ticks_diff(now, self._last), _encode(data)])
+        self._last = now
+
+    def read(self, size=-1):
+        try:
+            data = self._raw.read(size)
+        except Exception as e:
+            self._exchange["error"] = str(e)
+            raise
+        if data:
+            self._add(data)
+        return data
+
+    def settimeout(self, seconds):
+        if hasattr(self._raw, "settimeout"):
+            self._raw.settimeout(seconds)
+
+
+class RecordingResponse:
+    def __init__(self, recorder, exchange, response):
+        self._recorder = recorder
+        self._exchange = exchange
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = getattr(response, "headers", None) or {}
+        self.raw = RecordingRaw(exchange, response.raw)
+        self._content = None
+        self._closed = False
+
+    @property
+    def content(self):
+        if self._content is None:
+            parts = []
+            while True:
+                data = self.raw.read(1024)
+                if not data:
+                    break
+                parts.append(data)
+            self._content = b"".join(parts)
+        return self._content
+
+    @property
+    def text(self):
+        return str(self.content, "utf-8")
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._response.close()
+            self._recorder.write(self._exchange)
+
+
+class Recorder:
+    """urequests-style module that records everything fetched through it."""
+
+    def __init__(self, path, client):
+        self.path = path
+        self.client = client
+
+    def write(self, exchange):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(exchange) + "\n")
+        except Exception as e:
+            print(f"Cassette write error: {e}")
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        exchange = {"url": url, "status": None, "headers": {}, "connect_ms": 0,
+                    "chunks": [], "error": None}
+        start = time.ticks_ms()
+        try:
+            response = self.client.get(url, headers=headers or {}, timeout=timeout, **kwargs)
+        except Exception as e:
+            exchange["connect_ms"] = time.ticks_diff(time.ticks_ms(), start)
+            exchange["error"] = str(e)
+            self.write(exchange)
+            raise
+        exchange["connect_ms"] = time.ticks_diff(time.ticks_ms(), start)
+        exchange["status"] = response.status_code
+        exchange["headers"] = dict(getattr(response, "headers", None) or {})
+        return RecordingResponse(self, exchange, response)
+
+
+# Replay
+
+
+class ReplayRaw:
+    def __init__(self, player, exchange):
+        self._player = player
+        self._chunks = [(delay, _decode(data)) for delay, data in exchange["chunks"]]
+        self._error = exchange.get("error")
+        self._pending = b""
+        self._timeout = None
+
+    def settimeout(self, seconds):
+        self._timeout = seconds
+
+    def _next_chunk(self):
+        delay, data = self._chunks.pop(0)
+        if self._timeout is not None and delay > self._timeout * 1000:
+            # The recorded gap is longer than the caller is willing to wait
+            self._player.wait(self._timeout * 1000)
+            raise OSError(f"timed out (replayed {delay}ms gap)")
+        self._player.wait(delay)
+        return data
+
+    def read(self, size=-1):
+        if not self._pending:
+            if not self._chunks:
+                if self._error:
+                    error, self._error = self._error, None
+                    raise OSError(error)
+                return b""
+            self._pending = self._next_chunk()
+        if size is None or size < 0:
+            data = self._pending + b"".join(self._next_chunk() for _ in range(len(self._chunks)))
+            self._pending = b""
+            return data
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+class ReplayResponse:
+    def __init__(self, player, exchange):
+        self.status_code = exchange["status"]
+        self.headers = exchange.get("headers") or {}
+        self.raw = ReplayRaw(player, exchange)
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read()
+        return self._content
+
+    @property
+    def text(self):
+        return str(self.content, "utf-8")
+
+    def close(self):
+        pass
+
+
+class Player:
+    """urequests-style module that serves the exchanges from a cassette.
+
+    Requests for a URL are answered with that URL's recordings in order; the
+    last one is repeated once they run out.  ``speed`` scales the recorded
+    delays (0 = no waiting, 1 = as recorded); ``sleep`` can be swapped for a
+    virtual clock.  An unrecorded URL raises OSError like a network failure.
+    """
+
+    def __init__(self, path, speed=0, sleep=None):
+        self.speed = speed
+        self.sleep = sleep or (lambda ms: time.sleep(ms / 1000))
+        self.exchanges = {}
+        self.served = {}
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    exchange = json.loads(line)
+                    self.exchanges.setdefault(exchange["url"], []).append(exchange)
+
+    def hosts(self):
+        return set(url.split("://", 1)[-1].split("/", 1)[0].split(":")[0] for url in self.exchanges)
+
+    def wait(self, ms):
+        if self.speed and ms > 0:
+            self.sleep(ms * self.speed)
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        recorded = self.exchanges.get(url)
+        if not recorded:
+            raise OSError(f"no recording for {url}")
+        n = self.served.get(url, 0)
+        self.served[url] = n + 1
+        exchange = recorded[min(n, len(recorded) - 1)]
+        connect_ms = exchange.get("connect_ms", 0)
+        if timeout is not None and connect_ms > timeout * 1000:
+            self.wait(timeout * 1000)
+            raise OSError(f"timed out (replayed {connect_ms}ms connect)")
+        self.wait(connect_ms)
+        if exchange["status"] is None:
+            raise OSError(exchange.get("error") or "connection failed")
+        return ReplayResponse(self, exchange)
+
+
+def _offline_getaddrinfo(hosts, real):
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host in hosts:
+            return [(2, 1, 0, "", ("127.0.0.1", port))]
+        return real(host, port, *args, **kwargs)
+    return getaddrinfo
+
+
+def install(client):
+    """Route the device code's requests through ``client`` (a Recorder or
+    Player).  A Player also answers DNS lookups for its recorded hosts so
+    nothing touches the network.  Returns the client in place before."""
+    import http_client
+
+    previous = http_client.urequests
+    http_client.urequests = client
+    if isinstance(client, Player):
+        socket = http_client.socket
+        real = getattr(socket.getaddrinfo, "real", socket.getaddrinfo)
+        socket.getaddrinfo = _offline_getaddrinfo(client.hosts(), real)
+        socket.getaddrinfo.real = real
+    return previous
+
+
+def main():
+    import argparse
+    import hostshims
+
+    parser = argparse.ArgumentParser(description="Record or replay product fetches")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("cassette", help="JSON lines file of recorded exchanges")
+    parser.add_argument("product", help="weather product, e.g. METAR")
+    parser.add_argument("station", nargs="?", help="ICAO code for station products")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="replay delays at this fraction of real time (default: none)")
+    parser.add_argument("--pages", type=int, metavar="WIDTH",
+                        help="also lay the text out as pages of WIDTH characters")
+    args = parser.parse_args()
+
+    hostshims.install()
+    import http_client
+    import area_query
+    import products
+
+    info = products.weather_products[args.product]
+    url = info["url"]
+    if info.get("query"):
+        url = area_query.build_url(url, info["query"], args.station)
+
+    if args.mode == "record":
+        install(Recorder(args.cassette, http_client.urequests))
+    else:
+        install(Player(args.cassette, args.speed))
+
+    deadline = http_client.Deadline(info.get("budget_ms", http_client.DEFAULT_BUDGET_MS))
+    text = products.fetch(args.product, url, args.station, deadline)
+    print(f"Timing: {deadline.report()}")
+    if text is None:
+        raise SystemExit(f"Fetching {args.product} failed")
+    if not args.pages:
+        print(text)
+        return
+
+    import wire_format
+
+    # The display's own wrapping, so pages break where they would on screen
+    def wrap(line):
+        return wire_format.wrap_words(line, args.pages)
+
+    def clock():
+        now = time.gmtime()
+        return now.tm_mday, now.tm_hour, now.tm_min
+
+    for number, page in enumerate(products.paginate(args.product, text, wrap, clock, args.station), 1):
+        print(f"--- page {number}")
+        print("\n".join(page))
+
+
+if __name__ == "__main__":
+    main()
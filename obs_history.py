@@ -0,0 +1,204 @@
+# Per-station observation history on flash.
+#
+# Each watched station gets a small file holding a fixed number of decoded
+# METARs (see metar_decode.py) as fixed-size records in a ring.  The file
+# is created at full size, so adding an observation is one seek and one
+# record write plus a header update, never a rewrite.  Reads seek to the
+# records they need, so a trend over the last few hours only loads those.
+
+import struct
+from array import array
+
+import metar_decode
+from metar_decode import FIELDS, MISSING
+
+MAGIC = b"OBH1"
+HEADER = "<4sHHH"                 # magic, capacity, count, next slot
+RECORD = "<H" + "h" * (len(FIELDS) - 1)
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+CAPACITY = 48
+# Where the history files go: "" is the current directory (the device's
+# flash), None turns recording and trends off (the gateway unless told)
+DIRECTORY = ""
+
+MONTH_MINUTES = 31 * 1440
+
+
+def history_file(station):
+    if DIRECTORY:
+        return f"{DIRECTORY}/hist_{station}.bin"
+    return f"hist_{station}.bin"
+
+
+def minutes_between(earlier, later):
+    """Minutes from ``earlier`` to ``later`` observation times, across a
+    month boundary if need be."""
+    diff = later - earlier
+    if diff < -MONTH_MINUTES // 2:
+        diff += MONTH_MINUTES
+    return diff
+
+
+class History:
+    """A station's history file.  With ``create`` False it is opened read
+    only, and a missing or broken file raises instead of being (re)made."""
+
+    def __init__(self, station, capacity=CAPACITY, create=True):
+        self.path = history_file(station)
+        self._buf = bytearray(RECORD_SIZE)
+        self.f = None
+        try:
+            self.f = open(self.path, "r+b" if create else "rb")
+            header = self.f.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE:
+                raise ValueError(f"{self.path} header is short")
+            magic, self.capacity, self.count, self.head = struct.unpack(HEADER, header)
+            if magic != MAGIC or not self.capacity or self.count > self.capacity or self.head >= self.capacity:
+                raise ValueError(f"{self.path} is not a history file")
+        except Exception as e:
+            if self.f is not None:
+                self.f.close()
+                if create:
+                    # Start a broken file again rather than lose history for good
+                    print(f"History file reset: {e}")
+            if not create:
+                raise
+            self.f = open(self.path, "w+b")
+            self.capacity, self.count, self.head = capacity, 0, 0
+            self._write_header()
+            blank = bytes(RECORD_SIZE)
+            for _ in range(capacity):
+                self.f.write(blank)
+            self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __len__(self):
+        return self.count
+
+    def _write_header(self):
+        self.f.seek(0)
+        self.f.write(struct.pack(HEADER, MAGIC, self.capacity, self.count, self.head))
+
+    def _slot(self, i):
+        """File slot of record ``i``, 0 being the oldest kept."""
+        return (self.head - self.count + i) % self.capacity
+
+    def get(self, i):
+        """Record ``i`` (negative counts from the newest) as a tuple."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        self.f.seek(HEADER_SIZE + self._slot(i) * RECORD_SIZE)
+        self.f.readinto(self._buf)
+        return struct.unpack(RECORD, self._buf)
+
+    def append(self, values):
+        """Store a decoded observation; a repeat of the newest is ignored.
+
+        Returns True when a record was written.
+        """
+        if self.count and self.get(-1)[0] == values[0]:
+            return False
+        self.f.seek(HEADER_SIZE + self.head * RECORD_SIZE)
+        self.f.write(struct.pack(RECORD, *values))
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+        self.f.flush()
+        return True
+
+    def read(self, start, count):
+        """Records ``start`` .. ``start + count`` (oldest first), as tuples."""
+        start = max(start, 0)
+        end = min(start + count, self.count)
+        return [self.get(i) for i in range(start, end)]
+
+    def series(self, field, count):
+        """The newest ``count`` values of ``field`` as an array, oldest first."""
+        column = FIELDS.index(field)
+        values = array("h")
+        for i in range(max(self.count - count, 0), self.count):
+            values.append(self.get(i)[column])
+        return values
+
+    def since(self, minutes):
+        """Index of the newest record at least ``minutes`` older than the
+        newest one, or None."""
+        if not self.count:
+            return None
+        latest = self.get(-1)[0]
+        for i in range(self.count - 2, -1, -1):
+            if minutes_between(self.get(i)[0], latest) >= minutes:
+                return i
+        return None
+
+
+def record(station, text):
+    """Decode ``station``'s METAR from a fetched product and store it."""
+    if DIRECTORY is None:
+        return False
+    try:
+        report = metar_decode.find_report(text, station)
+        values = metar_decode.decode(report) if report else None
+    except Exception as e:
+        print(f"METAR decode error for {station}: {e}")
+        return False
+    if values is None:
+        return False
+    return record_fields(station, values)
+
+
+def record_fields(station, values):
+    """Store an already decoded observation for ``station``."""
+    if DIRECTORY is None:
+        return False
+    try:
+        history = History(station)
+        try:
+            return history.append(values)
+        finally:
+            history.close()
+    except Exception as e:
+        print(f"History write error for {station}: {e}")
+        return False
+
+
+def _ceiling(hundreds):
+    return "none" if hundreds == MISSING else f"{hundreds * 100}ft"
+
+
+def trend(station, hours=3):
+    """Short trend lines comparing the newest observation with the one
+    ``hours`` earlier: pressure tendency and ceiling change."""
+    if DIRECTORY is None:
+        return []
+    try:
+        # A station never recorded has no file, and looking doesn't make one
+        history = History(station, create=False)
+    except Exception:
+        return []
+    try:
+        if len(history) < 2:
+            return []
+        then_index = history.since(hours * 60)
+        if then_index is None:
+            then_index = 0
+        now = history.get(-1)
+        then = history.get(then_index)
+        span = minutes_between(then[0], now[0])
+        lines = []
+        alt = FIELDS.index("alt")
+        if now[alt] != MISSING and then[alt] != MISSING:
+            change = now[alt] - then[alt]
+            word = "rising" if change > 1 else "falling" if change < -1 else "steady"
+            lines.append(f"ALT {now[alt] / 100:.2f} {word} {change / 100:+.2f} in {span // 60}h{span % 60:02d}")
+        ceil = FIELDS.index("ceil")
+        if now[ceil] != then[ceil]:
+            lines.append(f"CIG {_ceiling(then[ceil])} -> {_ceiling(now[ceil])}")
+        return lines
+    finally:
+        history.close()
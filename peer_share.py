@@ -0,0 +1,304 @@
+# Sharing fetched products between displays on the same network.
+#
+# For sites without a gateway (see gateway.py), displays cooperate instead.
+# After a device fetches a product it broadcasts a one-line offer on UDP
+# port PORT:
+#
+#   PMS1 <node> HAVE <product> <station> <crc> <age ms>
+#
+# Peers remember the offers they hear.  Before going upstream a device
+# pulls a fresh enough copy from a peer that has one, over a short TCP
+# exchange on the same port:
+#
+#   request   "<product> <station>\n"
+#   answer    "<crc> <length>\n" and the text, or "- 0\n"
+#
+# To keep N displays at about one upstream fetch per product per interval:
+#
+#   - a device about to fetch upstream first broadcasts "CLAIM"; a device
+#     that heard a claim for the same product waits up to CLAIM_WAIT_MS for
+#     the claimer's offer instead of fetching as well
+#   - before claiming it broadcasts "WANT", so peers holding the product
+#     re-offer it, and waits a short random time, which lets the first
+#     claim win
+#   - an offer is only used while its age, counted from when it was heard,
+#     is within the caller's limit, and the same product is only re-offered
+#     when its text changes (or someone asks)
+#   - an offer with the CRC of the copy already held isn't pulled at all
+#
+# Only plain text is shared; pre-laid-out gateway payloads are not.
+
+import random
+import socket
+import time
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+try:
+    import _thread
+    _lock = _thread.allocate_lock()
+except ImportError:
+    _lock = None
+
+PORT = 47810
+MAGIC = "PMS1"
+CLAIM_WAIT_MS = 8000
+CLAIM_JITTER_MS = 500
+OFFER_TTL_MS = 600000
+PULL_TIMEOUT_S = 3
+MAX_PULL_BYTES = 16384
+
+SO_BROADCAST = getattr(socket, "SO_BROADCAST", 0x20)
+
+
+def broadcast_address(ip, mask):
+    """Subnet broadcast address for ``ip`` / ``mask`` (dotted quads)."""
+    parts = [int(a) | (~int(m) & 255) for a, m in zip(ip.split("."), mask.split("."))]
+    return ".".join(str(p) for p in parts)
+
+
+def text_crc(text):
+    data = text.encode()
+    if crc32 is not None:
+        return crc32(data) & 0xFFFFFFFF
+    return hash(data) & 0xFFFFFFFF
+
+
+def _station(station):
+    return station or "-"
+
+
+class Share:
+    """One device's end of the sharing.
+
+    ``lookup(product, station)`` returns the ``(text, age_ms)`` this device
+    holds, or ``(None, None)``; it is what peers are served from.
+    """
+
+    def __init__(self, lookup, broadcast="255.255.255.255", port=PORT):
+        self.lookup = lookup
+        self.target = (broadcast, port)
+        self.port = port
+        self.node = "%04x" % random.getrandbits(16)
+        # (product, station) -> (peer address, crc, age ms, heard at)
+        self.offers = {}
+        # (product, station) -> ticks a peer claimed it
+        self.claims = {}
+        # (product, station) -> crc last offered by us
+        self.offered = {}
+        self.stats = {"announced": 0, "pulled": 0, "served": 0, "claimed": 0, "deferred": 0}
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.udp.setsockopt(socket.SOL_SOCKET, SO_BROADCAST, 1)
+        except OSError as e:
+            print(f"Broadcast not enabled: {e}")
+        self.udp.bind(("0.0.0.0", port))
+        self.udp.setblocking(False)
+
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind(("0.0.0.0", port))
+        self.tcp.listen(2)
+        self.tcp.setblocking(False)
+        print(f"Sharing products on port {port} as {self.node}")
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+    def _send(self, *words):
+        message = " ".join((MAGIC, self.node) + words)
+        try:
+            self.udp.sendto(message.encode(), self.target)
+        except OSError as e:
+            print(f"Peer broadcast failed: {e}")
+
+    def announce(self, product, station, text, age_ms=0, force=False):
+        """Offer ``text`` to peers, unless the same text was offered already."""
+        if not isinstance(text, str) or not text:
+            return
+        key = (product, _station(station))
+        crc = text_crc(text)
+        if not force and self.offered.get(key) == crc:
+            return
+        self.offered[key] = crc
+        self.stats["announced"] += 1
+        self._send("HAVE", key[0], key[1], str(crc), str(age_ms))
+
+    def poll(self):
+        """Handle waiting announcements and at most one pull from a peer.
+
+        Call this often (e.g. every display loop).
+        """
+        if _lock:
+            _lock.acquire()
+        try:
+            self._receive()
+            self._serve()
+        finally:
+            if _lock:
+                _lock.release()
+
+    def _held(self, key):
+        """Our copy for a wire key; "-" is a product without a station."""
+        return self.lookup(key[0], None if key[1] == "-" else key[1])
+
+    def _receive(self):
+        now = time.ticks_ms()
+        while True:
+            try:
+                packet, addr = self.udp.recvfrom(256)
+            except OSError:
+                return
+            try:
+                words = packet.decode().split()
+            except Exception:
+                continue
+            if len(words) < 5 or words[0] != MAGIC or words[1] == self.node:
+                continue
+            kind, key = words[2], (words[3], words[4])
+            if kind == "HAVE":
+                if len(words) < 7:
+                    continue
+                try:
+                    crc, age_ms = int(words[5]), int(words[6])
+                except ValueError:
+                    # Not one of ours; drop it
+                    continue
+                self.offers[key] = (addr[0], crc, age_ms, now)
+                self.claims.pop(key, None)
+            elif kind == "CLAIM":
+                self.claims[key] = now
+            elif kind == "WANT":
+                text, age_ms = self._held(key)
+                if text:
+                    self.announce(key[0], key[1], text, age_ms, force=True)
+
+    def _serve(self):
+        try:
+            conn, addr = self.tcp.accept()
+        except OSError:
+            return
+        try:
+            conn.settimeout(PULL_TIMEOUT_S)
+            words = _read_line(conn).split()
+            text = None
+            if len(words) == 2:
+                text, _ = self._held((words[0], words[1]))
+            if isinstance(text, str) and text:
+                body = text.encode()
+                conn.sendall(f"{text_crc(text)} {len(body)}\n".encode() + body)
+                self.stats["served"] += 1
+            else:
+                conn.sendall(b"- 0\n")
+        except Exception as e:
+            print(f"Serving peer {addr[0]} failed: {e}")
+        finally:
+            conn.close()
+
+    def _fresh_offer(self, key, max_age_ms):
+        offer = self.offers.get(key)
+        if offer is None:
+            return None
+        age_ms = offer[2] + time.ticks_diff(time.ticks_ms(), offer[3])
+        if age_ms > OFFER_TTL_MS:
+            del self.offers[key]
+            return None
+        return offer if age_ms <= max_age_ms else None
+
+    def fetch(self, product, station, max_age_ms, current=None):
+        """``(text, age_ms)`` from a peer, or ``(None, None)`` to go upstream.
+
+        ``current`` is the copy already held; when a peer offers the same
+        text, it is returned as is without a pull.  When no peer has a fresh copy
+        this device claims the fetch, so the caller must then fetch upstream
+        and ``announce`` the result.
+        """
+        key = (product, _station(station))
+        self.poll()
+        claimed = self.claims.get(key)
+        if claimed is None and self._fresh_offer(key, max_age_ms) is None:
+            # Ask peers holding it to re-offer, and let a claim that is
+            # already on its way arrive first
+            self._send("WANT", key[0], key[1])
+            time.sleep_ms(random.getrandbits(16) % CLAIM_JITTER_MS)
+            self.poll()
+            claimed = self.claims.get(key)
+        if claimed is not None and self._fresh_offer(key, max_age_ms) is None:
+            # Another display is fetching it; wait for its offer
+            self.stats["deferred"] += 1
+            while (self._fresh_offer(key, max_age_ms) is None
+                   and time.ticks_diff(time.ticks_ms(), claimed) < CLAIM_WAIT_MS):
+                time.sleep_ms(100)
+                self.poll()
+            self.claims.pop(key, None)
+        offer = self._fresh_offer(key, max_age_ms)
+        if offer is not None:
+            peer, crc, age_ms, heard = offer
+            age_ms += time.ticks_diff(time.ticks_ms(), heard)
+            if isinstance(current, str) and current and text_crc(current) == crc:
+                return current, age_ms
+            text = self.pull(peer, key)
+            if text is not None:
+                self.stats["pulled"] += 1
+                self.offered[key] = text_crc(text)
+                return text, age_ms
+        self.stats["claimed"] += 1
+        self._send("CLAIM", key[0], key[1])
+        return None, None
+
+    def pull(self, peer, key):
+        """Fetch ``key``'s text from ``peer`` over TCP, or None."""
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            conn.settimeout(PULL_TIMEOUT_S)
+            conn.connect(socket.getaddrinfo(peer, self.port)[0][-1])
+            conn.sendall(f"{key[0]} {key[1]}\n".encode())
+            words = _read_line(conn).split()
+            if len(words) != 2 or words[0] == "-":
+                return None
+            crc, length = int(words[0]), int(words[1])
+            if length > MAX_PULL_BYTES:
+                return None
+            body = _read_exact(conn, length)
+            text = str(body, "utf-8")
+            if text_crc(text) != crc:
+                print(f"Bad copy of {key[0]} from {peer}")
+                return None
+            print(f"Got {key[0]} from peer {peer}")
+            return text
+        except Exception as e:
+            print(f"Pull from peer {peer} failed: {e}")
+            # Don't try that peer again for this product
+            self.offers.pop(key, None)
+            return None
+        finally:
+            conn.close()
+
+
+def _read_line(conn, limit=64):
+    line = bytearray()
+    while len(line) < limit:
+        c = conn.recv(1)
+        if not c or c == b"\n":
+            break
+        line.extend(c)
+    return line.decode()
+
+
+def _read_exact(conn, length):
+    body = bytearray(length)
+    view = memoryview(body)
+    got = 0
+    while got < length:
+        chunk = conn.recv(min(length - got, 1024))
+        if not chunk:
+            raise OSError("peer closed early")
+        view[got:got + len(chunk)] = chunk
+        got += len(chunk)
+    return body
@@ -1,5 +1,4 @@
 import network
-import urequests
 import time
 from picographics import PicoGraphics, DISPLAY_PICO_DISPLAY, PEN_RGB332
 from pimoroni import Button
@@ -7,6 +6,17 @@ from machine import RTC
 import socket
 import struct
 import wifi_config
+import resilience
+import http_client
+import station_index
+import station_grid
+import area_query
+import products
+import prefetch
+import net_worker
+import heap
+import wire_format
+from products import weather_products
 
 # Initialize display and buttons
 display = PicoGraphics(DISPLAY_PICO_DISPLAY, pen_type=PEN_RGB332, rotate=0)
@@ -64,34 +74,57 @@ metar_stations = [
     {"state": "GA", "name": "HARTSFIELD-JACKSON ATLANTA INTL", "icao": "KATL"},
 ]
 
-# Supported weather products and their URL patterns.  If a product requires
-# a station code in the URL the string contains ``{station}`` as a placeholder.
-weather_products = {
-    "METAR": {
-        "needs_station": True,
-        "url": "http://tgftp.nws.noaa.gov/data/observations/metar/stations/{station}.TXT",
-    },
-    "TAF": {
-        "needs_station": True,
-        "url": "http://tgftp.nws.noaa.gov/data/forecasts/taf/stations/{station}.TXT",
-    },
-    "AIRMET": {
-        "needs_station": False,
-        "url": "https://aviationweather.gov/api/data/gairmet?format=raw",
-    },
-    "SIGMET": {
-        "needs_station": False,
-        "url": "https://aviationweather.gov/api/data/airsigmet?format=raw",
-    },
-    "PIREP": {
-        "needs_station": False,
-        "url": "https://aviationweather.gov/api/data/pirep?format=raw",
-    },
-    "ISIGMET": {
-        "needs_station": False,
-        "url": "https://aviationweather.gov/api/data/isigmet?format=raw",
-    },
-}
+# Total time allowed for one fetch attempt (DNS + connect + read).  A
+# product can override it with a "budget_ms" entry.
+FETCH_BUDGET_MS = 15000
+
+# Centre used for area products such as PIREPs (see AREA_RADIUS_NM in
+# products/__init__.py).  It follows the last station picked in the
+# station menu.
+home_station = metar_stations[0]["icao"]
+NEARBY_COUNT = 10
+
+# Run fetching and parsing on the second core so the display and buttons
+# stay responsive during slow requests (see net_worker.py).
+USE_SECOND_CORE = False
+_worker = None
+
+def get_worker():
+    """The second-core network worker, or None when it is disabled."""
+    global _worker
+    if USE_SECOND_CORE and _worker is None:
+        worker = net_worker.Worker()
+        _worker = worker if worker.start() else False
+    return _worker or None
+
+# Share fetched products with other displays on the network that have this
+# turned on too, instead of each fetching from NOAA (see peer_share.py).
+SHARE_WITH_PEERS = False
+# A copy a peer fetched this recently stands in for a forced refresh
+SHARE_MAX_AGE_MS = 60000
+_peers = None
+
+def get_peers():
+    """The peer sharing endpoint, or None when it is disabled."""
+    global _peers
+    if SHARE_WITH_PEERS and _peers is None:
+        try:
+            # Only loaded when turned on, so it costs nothing otherwise
+            import peer_share
+            ip, mask = network.WLAN(network.STA_IF).ifconfig()[:2]
+            _peers = peer_share.Share(peer_lookup, peer_share.broadcast_address(ip, mask))
+        except Exception as e:
+            print(f"Peer sharing unavailable: {e}")
+            _peers = False
+    return _peers or None
+
+def peer_lookup(product, station):
+    """What peers are served: the last good copy and its age.
+
+    Only the exact station asked for; an area product keyed by a peer's home
+    station must not be answered with ours.
+    """
+    return resilience.last_good(f"{product}:{station or ''}")
 
 def connect_to_wifi():
     max_attempts = 3
@@ -115,17 +148,17 @@ def connect_to_wifi():
     time.sleep(2)
     return False
 
-def display_text(lines, selected_index=None):
+def display_text(lines, selected_index=None, line_height=10):
     try:
         display.set_pen(BLACK)
         display.clear()
         for i, line in enumerate(lines):
             if selected_index is not None and i == selected_index:
                 display.set_pen(WHITE)
-                display.text(">" + line, 0, i * 10, WIDTH, 2)
+                display.text(">" + line, 0, i * line_height, WIDTH, 2)
             else:
                 display.set_pen(WHITE)
-                display.text(line, 0, i * 10, WIDTH, 2)
+                display.text(line, 0, i * line_height, WIDTH, 2)
         display.update()
     except Exception as e:
         print(f"Display error: {e}")
@@ -226,6 +259,8 @@ def product_menu():
 def station_menu():
     display.set_font("bitmap8")
     options = ["Select Airport", "Enter Airport"]
+    if get_station_grid() and get_station_index():
+        options.append("Nearby Airports")
     selected_option = 0
     last_update = time.ticks_ms()
     last_debug = time.ticks_ms()
@@ -261,7 +296,14 @@ def station_menu():
             elif button_y.read():
                 selected_option = (selected_option + 1) % len(options)
             elif button_a.read():
-                return select_station() if selected_option == 0 else enter_airport()
+                if selected_option == 0:
+                    station = select_station()
+                elif selected_option == 1:
+                    station = enter_airport()
+                else:
+                    station = select_station(nearby_stations(home_station))
+                set_home_station(station)
+                return station
 
             time.sleep(0.01)  # Short sleep to prevent tight loop
             
@@ -269,15 +311,17 @@ def station_menu():
             print(f"Menu error: {e}")
             time.sleep(1)  # Pause before retrying
 
-def select_station():
+def select_station(stations=None):
+    if not stations:
+        stations = metar_stations
     selected_station_index = 0
 
     while True:
         display.set_pen(BLACK)
         display.clear()
         
-        for i in range(len(metar_stations)):
-            station = metar_stations[i]
+        for i in range(len(stations)):
+            station = stations[i]
             city_name = station['name'][:16]  # Truncate city name if longer than 16 characters
             text_line = f"{station['state']} {city_name} {station['icao']}"
 
@@ -292,319 +336,439 @@ def select_station():
         display.update()
 
         if button_x.read():
-            selected_station_index = (selected_station_index - 1) % len(metar_stations)
+            selected_station_index = (selected_station_index - 1) % len(stations)
         elif button_y.read():
-            selected_station_index = (selected_station_index + 1) % len(metar_stations)
+            selected_station_index = (selected_station_index + 1) % len(stations)
         elif button_a.read():
-            return metar_stations[selected_station_index]['icao']
+            return stations[selected_station_index]['icao']
             
         time.sleep(0.1)
 
+_station_index = None
+
+def get_station_index():
+    """Open stations.bin once; None when no index is on the device."""
+    global _station_index
+    if _station_index is None:
+        _station_index = station_index.open_index() or False
+    return _station_index or None
+
+_station_grid = None
+
+def get_station_grid():
+    """Open stations.grd once; None when no grid is on the device."""
+    global _station_grid
+    if _station_grid is None:
+        _station_grid = station_grid.open_grid() or False
+    return _station_grid or None
+
+def set_home_station(icao):
+    """Remember the last chosen station as the centre for area products."""
+    global home_station
+    if icao:
+        home_station = heap.intern(icao)
+
+def station_position(icao):
+    index = get_station_index()
+    station = index.get(icao) if index else None
+    if station is None:
+        return None
+    return station["lat"], station["lon"]
+
+def nearby_stations(icao, count=NEARBY_COUNT):
+    """Stations closest to ``icao`` as ``metar_stations``-style dicts."""
+    grid = get_station_grid()
+    index = get_station_index()
+    position = station_position(icao)
+    if not grid or position is None:
+        return []
+    stations = []
+    for distance, i in grid.nearest(position[0], position[1], count):
+        station = index.record(i)
+        station["name"] = f"{int(distance)}nm {station['name']}"
+        stations.append(station)
+    return stations
+
 def enter_airport():
-    characters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    char_index = 0
-    airport_code = ["K", "A", "A", "A"]
-    position = 0  # Current position being edited
+    """Enter an ICAO code with X/Y to pick a character, A to accept, B to delete.
+
+    The characters that can come next are listed under the code.  With a
+    station index only characters that continue a known code are offered,
+    so a complete code always exists, the best matches are listed too, and
+    a prefix that matches a single station is completed straight away.
+    """
+    completer = station_index.Completer(get_station_index())
+    char_index = completer.start()
+    matches = None
 
     last_blink_time = time.ticks_ms()
     cursor_visible = True  # Initial cursor state
 
-    while position < 4:
+    while True:
         current_time = time.ticks_ms()
         if time.ticks_diff(current_time, last_blink_time) > 500:  # Blink every 500 ms
             cursor_visible = not cursor_visible
             last_blink_time = current_time
 
-        # Display code with blinking cursor
-        code_str = ''.join(airport_code)
-        cursor_str = code_str[:position] + ('_' if cursor_visible else code_str[position]) + code_str[position + 1:]
-        display_text([f"Enter Airport: {cursor_str}"], None)
+        choices = completer.choices
+        candidate = choices[char_index] if choices else ""
+        if matches is None:
+            matches = completer.matches(candidate)
 
-        if button_x.read():
-            char_index = (char_index - 1) % len(characters)
-            airport_code[position] = characters[char_index]
-        elif button_y.read():
-            char_index = (char_index + 1) % len(characters)
-            airport_code[position] = characters[char_index]
+        # Display code with blinking cursor
+        code_str = completer.prefix + candidate
+        cursor_str = code_str[:len(completer.prefix)] + ('_' if cursor_visible and candidate else candidate)
+        lines = [f"Enter Airport: {cursor_str}"]
+        if choices:
+            # Starting from the one picked
+            lines.append("Next: " + choices[char_index:] + choices[:char_index])
+        if completer.is_complete():
+            lines.append("A to confirm")
+        for station in matches:
+            lines.append(f"{station['icao']} {station['state']} {station['name']}")
+        # Cut to the screen rather than wrapped over the next line
+        display_text([line[:LINE_CHARS] for line in lines], None, LINE_HEIGHT)
+
+        if button_x.read() and choices:
+            char_index = (char_index - 1) % len(choices)
+            matches = None
+        elif button_y.read() and choices:
+            char_index = (char_index + 1) % len(choices)
+            matches = None
         elif button_a.read():
-            position += 1
-            char_index = 0  # Reset character index for next position
+            if completer.is_complete():
+                return completer.prefix
+            completer.push(candidate)
+            char_index = completer.start()
+            matches = None
+        elif button_b.read() and completer.prefix:
+            completer.pop()
+            char_index = completer.start()
+            matches = None
 
         time.sleep(0.1)
 
-    return ''.join(airport_code)
-
-def wrap_text(text, char_width, max_width):
-    """Word-wrap text for a fixed-width font."""
-    words = text.split(" ")
-    lines = []
-    current = ""
-    for word in words:
-        if len(current) + len(word) + (1 if current else 0) > max_width // char_width:
-            lines.append(current)
-            current = word
-        else:
-            if current:
-                current += " "
-            current += word
-    lines.append(current)
-    return lines
-
-def parse_isigmet(raw_text):
-    """Split ISIGMET data into pages and reorder US pages first."""
-    import re
-
-    pages = [p.strip() for p in raw_text.split("----------------------") if p.strip()]
-
-    def has_us_identifier(text):
-        return re.search(r"\bK[A-Z]{3}\b", text) is not None
-
-    us_pages = [p for p in pages if has_us_identifier(p)]
-    other_pages = [p for p in pages if not has_us_identifier(p)]
-    ordered_pages = us_pages + other_pages
-
-    # Split each page into wrapped lines
-    wrapped_pages = []
-    for page in ordered_pages:
-        lines = []
-        for raw in page.split("\n"):
-            lines.extend(wrap_text(raw, CHAR_WIDTH * TEXT_SCALE, WIDTH))
-        wrapped_pages.append(lines)
-    return wrapped_pages
-
-def fetch_large_data_stream(url, max_size=8192, chunk_size=1024):
-    """Generic function to fetch large weather data with memory management."""
-    try:
-        headers = {
-            'User-Agent': 'Pico-METAR-Display/1.0',
-            'Accept': 'text/plain'
-        }
-        print(f"Trying URL: {url}")
-        
-        response = urequests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"HTTP error {response.status_code}")
-            response.close()
-            return None
-
-        # Read content in smaller chunks to avoid memory allocation issues
-        content_parts = []
-        total_size = 0
-        
-        try:
-            while True:
-                chunk = response.raw.read(chunk_size)
-                if not chunk:
-                    break
-                
-                total_size += len(chunk)
-                if total_size > max_size:
-                    print(f"Response too large ({total_size} bytes), truncating at {max_size}")
-                    break
-                    
-                content_parts.append(chunk.decode('utf-8'))
-                
-        except MemoryError:
-            print("Memory error during read, using partial data")
-        
-        response.close()
-        
-        # Join the parts
-        result = ''.join(content_parts).strip()
-        print(f"Fetched data: {len(result)} characters")
-        return result
-        
-    except MemoryError:
-        print("Memory allocation failed")
-        return ""  # Return empty string instead of None
-    except Exception as e:
-        print(f"Error fetching data: {e}")
-        return None
-
-def fetch_pirep_stream(url):
-    """Fetch PIREP data with memory optimization and filtering."""
-    try:
-        # Add parameters to limit response size
-        # Get only recent PIREPs (last 2 hours) to reduce data volume
-        limited_url = f"{url}&age=2"
-        
-        return fetch_large_data_stream(limited_url, max_size=6144, chunk_size=512)
-        
-    except Exception as e:
-        print(f"Error fetching PIREP: {e}")
-        return None
+def cache_station(product, station=None):
+    """The station a product is cached and shared under.
 
-def fetch_sigmet_stream(url):
-    """Fetch SIGMET data with memory optimization."""
-    try:
-        # SIGMETs are usually smaller but can still cause issues
-        return fetch_large_data_stream(url, max_size=8192, chunk_size=1024)
-        
-    except Exception as e:
-        print(f"Error fetching SIGMET: {e}")
+    Area products narrowed around the station go under the home station by
+    default; national feeds are the same for every station, so under none.
+    """
+    query = weather_products.get(product, {}).get("query")
+    if not query:
+        return station
+    if not area_query.uses_station(query):
         return None
-
-def fetch_isigmet_stream(url):
-    """Fetch ISIGMET data with memory optimization."""
-    try:
-        # Add parameters to limit response size
-        # Filter by hazard type to reduce data volume
-        limited_url = f"{url}&hazard=turb"  # Only turbulence SIGMETs
-        
-        return fetch_large_data_stream(limited_url, max_size=8192, chunk_size=1024)
-        
-    except Exception as e:
-        print(f"Error fetching ISIGMET: {e}")
-        return None
-
-def fetch_weather_data(product, station=None, max_retries=3):
-    """Fetch text data for the given weather product with memory management."""
+    return station or home_station
+
+def product_key(product, station=None):
+    """Cache key for a product (see ``cache_station``)."""
+    return f"{product}:{cache_station(product, station) or ''}"
+
+def fetch_weather_data(product, station=None, max_retries=3, timings=None, max_age_ms=None):
+    """Fetch text data for the given weather product with memory management.
+
+    A copy fetched less than ``max_age_ms`` ago (default: the product's
+    CACHE_TTL_MS) is returned without touching the network; pass 0 to force
+    a fetch.  Retries back off per host and stop early while the host's
+    circuit is open; in that case the last good data is returned instead
+    (see ``resilience.last_good`` for its age).  Each attempt runs under its
+    own ``FETCH_BUDGET_MS`` deadline; pass a list as ``timings`` to receive
+    the per-phase timings (ms) of every attempt.
+    """
     info = weather_products.get(product)
     if not info:
         return None
-    url = info["url"].format(station=station or "")
-    
-    for attempt in range(max_retries):
-        print(f"Fetching {product} (attempt {attempt + 1}/{max_retries})")
+    if max_age_ms is None:
+        max_age_ms = products.load(product).CACHE_TTL_MS
+    query = info.get("query")
+    shared_as = cache_station(product, station)
+    if query:
+        # Area products are narrowed around the home station by the server,
+        # and its mentions are what the A button jumps to
+        station = station or home_station
+    cached, age_ms = resilience.last_good(product_key(product, station))
+    if cached is not None and age_ms < max_age_ms:
+        print(f"Using cached {product}, {age_ms // 1000}s old")
+        return cached
+    peers = get_peers()
+    if peers:
+        shared, age_ms = peers.fetch(product, shared_as, max(max_age_ms, SHARE_MAX_AGE_MS), cached)
+        if shared is not None:
+            resilience.store(product_key(product, station), shared, age_ms)
+            return shared
+    url = info["url"]
+    if query:
+        position = station_position(station) if "bbox" in query else None
+        url = area_query.build_url(url, query, station, position)
+    print(f"Fetching {product}")
+    # Sockets a bug left open would otherwise run the pool dry over days
+    http_client.reap()
+
+    def attempt():
+        deadline = http_client.Deadline(info.get("budget_ms", FETCH_BUDGET_MS))
         try:
-            # Use specialized fetchers for large data products
-            if product == "PIREP":
-                data = fetch_pirep_stream(url)
-            elif product == "SIGMET":
-                data = fetch_sigmet_stream(url)
-            elif product == "ISIGMET":
-                data = fetch_isigmet_stream(url)
-            else:
-                # Regular handling for METAR, TAF, AIRMET
-                headers = {
-                    'User-Agent': 'Pico-METAR-Display/1.0',
-                    'Accept': 'text/plain'
-                }
-                print(f"Trying URL: {url}")
-                response = urequests.get(url, headers=headers)
-                if response.status_code == 200:
-                    data = response.text
-                    response.close()
-                    
-                    # Clean up the data
-                    lines = [line for line in data.strip().split('\n') if line.strip()]
-                    cleaned = '\n'.join(lines)
-                    print("Successfully fetched data:", cleaned[:200] + "..." if len(cleaned) > 200 else cleaned)
-                    return cleaned
-                else:
-                    print(f"HTTP error {response.status_code}")
-                    response.close()
-                    continue
-            
-            # Handle the streamed data response
-            if data is not None:  # Allow empty string but not None
-                if data == "":
-                    return "No current data available"
-                # Clean up the data
-                lines = [line for line in data.strip().split('\n') if line.strip()]
-                cleaned = '\n'.join(lines)
-                return cleaned
-            else:
-                raise Exception(f"Failed to fetch {product}")
-                
-        except Exception as e:
-            print(f"Error fetching {product}: {e}")
-            time.sleep(1)
-    
-    print(f"All attempts to fetch {product} failed")
-    return None
+            return products.fetch(product, url, station, deadline)
+        finally:
+            print(f"{product} timing: {deadline.report()}")
+            print(f"HTTP: {http_client.report()}")
+            if timings is not None:
+                timings.append(deadline.timings)
+
+    data, stale_ms = resilience.call(
+        resilience.host_of(url),
+        attempt,
+        product_key(product, station),
+        max_retries,
+    )
+    if data is None:
+        print(f"All attempts to fetch {product} failed")
+    elif stale_ms is not None:
+        print(f"Serving last good {product}, {stale_ms // 1000}s old")
+    elif peers:
+        peers.announce(product, shared_as, data)
+    return data
+
+def fetched_at(product, station=None):
+    """``ticks_ms`` value at which the cached copy of a product was fetched."""
+    _, age_ms = resilience.last_good(product_key(product, station))
+    if age_ms is None:
+        return None
+    return time.ticks_add(time.ticks_ms(), -age_ms)
+
+def fetch_job(product, station=None, max_age_ms=None):
+    """Worker job: the product text ("" on failure) and when it was fetched."""
+    data = fetch_weather_data(product, station, max_age_ms=max_age_ms)
+    return data or "", fetched_at(product, station)
 
 # Text rendering configuration
+REFRESH_MS = 120000
+# How long "NEW" stays in the header after a refresh brings changed text
+NEW_MS = 60000
 TEXT_SCALE = 2
 LINE_HEIGHT = 16  # bitmap8 at scale 2 is ~16px tall
 CHAR_WIDTH = 5    # Approximate average character width in pixels
+LINE_CHARS = WIDTH // (CHAR_WIDTH * TEXT_SCALE)
+
+# Ask a gateway for products already wrapped to this width (wire_format.py)
+products.stream.wire_width = LINE_CHARS
+
+def wrap_line(text):
+    # The gateway wraps with the same function, so layouts match
+    return wire_format.wrap_words(text, LINE_CHARS)
+
+def utc_clock():
+    """``(day, hour, minute)`` from the RTC for products that need the time."""
+    now = RTC().datetime()
+    return now[2], now[4], now[5]
+
+def paginate_product(product, data, station=None):
+    if data is None:
+        return [wrap_line(f"Fetching {product}...")]
+    if not data:
+        return [wrap_line(f"Error fetching {product}")]
+    # A national feed may come from the cache, fetched for another home
+    # station; its reports are indexed for this one
+    return products.paginate(product, data, wrap_line, utc_clock, station or home_station)
 
 def display_weather(product, station=None):
-    data = fetch_weather_data(product, station)
+    worker = get_worker()
+    if worker:
+        # Product modules are loaded and unloaded here, not mid-fetch
+        worker.wait_idle()
+    # The products prefetched from this screen are imported now too, so the
+    # worker only looks modules up while the UI pages with them
+    related = prefetch.RELATED.get(product, ())
+    products.unload(keep=(product,) + related)
+    handler = products.load(product)
+    for name in related:
+        products.load(name)
+    if worker:
+        # Shown as "Fetching..." until the worker posts the result
+        data = None
+        data_time = None
+        worker.submit((product, station), fetch_job, product, station)
+        prefetch_fetch = lambda p, s: worker.submit((p, s), fetch_job, p, s)
+    else:
+        data = fetch_weather_data(product, station) or ""
+        data_time = fetched_at(product, station)
+        prefetch_fetch = fetch_weather_data
+    prefetcher = prefetch.Prefetcher(product, station)
+    peers = get_peers()
     last_update = time.ticks_ms()
     last_ntp_update = time.ticks_ms()
     scroll = 0
     page_index = 0
     pages = None
+    pages_source = None
+    last_layout = 0
+    new_until = None
 
     while True:
         current_time = time.ticks_ms()
 
         # Refresh data every 2 minutes
-        if time.ticks_diff(current_time, last_update) >= 120000:
-            new_data = fetch_weather_data(product, station)
-            if new_data:
-                data = new_data
+        if time.ticks_diff(current_time, last_update) >= REFRESH_MS:
+            if worker:
+                worker.submit((product, station), fetch_job, product, station, 0)
+            else:
+                new_data = fetch_weather_data(product, station, max_age_ms=0)
+                if new_data:
+                    data = new_data
+                data_time = fetched_at(product, station)
             last_update = current_time
+            # Keep the related products warm too
+            prefetcher.plan(product)
 
         # Update NTP time every 2 minutes
         if time.ticks_diff(current_time, last_ntp_update) >= 120000:
-            set_rtc_from_ntp()
+            if worker:
+                worker.submit("ntp", set_rtc_from_ntp)
+            else:
+                set_rtc_from_ntp()
             last_ntp_update = current_time
 
-        current_utc = get_current_utc()
+        # Collect what the worker has finished; the text is ours from here
+        while worker:
+            result = worker.poll()
+            if result is None:
+                break
+            key, value = result
+            if key != (product, station):
+                continue
+            if not value:
+                data = data or ""
+                continue
+            new_data, new_time = value
+            if new_data or data is None:
+                data = new_data
+                data_time = new_time
+
+        # An unchanged refresh hands back the same text object (see
+        # products.fetch), so everything below is skipped for it
+        if pages_source and data and data is not pages_source:
+            new_until = time.ticks_add(current_time, NEW_MS)
+
+        # Lay the product out again only when its text changes, or on the
+        # product's own schedule (e.g. the TAF period moving on)
+        if pages is None or data is not pages_source or (
+            handler.REPAGINATE_MS and time.ticks_diff(current_time, last_layout) >= handler.REPAGINATE_MS
+        ):
+            # Pages are kept a while; build them after clearing out garbage
+            heap.collect()
+            pages = paginate_product(product, data, station)
+            pages_source = data
+            last_layout = current_time
+            page_index = min(page_index, len(pages) - 1)
+
+        # Flag data that is older than a missed refresh (host unreachable)
+        header = None
+        age_ms = None if data_time is None else time.ticks_diff(current_time, data_time)
+        if age_ms is not None and age_ms > REFRESH_MS + 30000:
+            header = f"STALE {age_ms // 60000}m"
+        if new_until is not None:
+            if time.ticks_diff(new_until, current_time) > 0:
+                header = "NEW" + (" " + header if header else "")
+            else:
+                new_until = None
+        if handler.SHOW_CLOCK:
+            header = get_current_utc() + (" " + header if header else "")
+
         display.set_pen(BLACK)
         display.clear()
         display.set_pen(WHITE)
         display.set_font("bitmap8")
 
-        if product == "ISIGMET" and data is not None:
-            if data.strip() == "":
-                lines = ["No active ISIGMETs"]
-            else:
-                if pages is None:
-                    pages = parse_isigmet(data)
-                if page_index >= len(pages):
-                    page_index = len(pages) - 1
-                lines = pages[page_index]
-        else:
-            if data:
-                full_text = current_utc + '\n' + data
-            else:
-                full_text = f"Error fetching {product}"
-            lines = []
-            for raw in full_text.split('\n'):
-                lines.extend(wrap_text(raw, CHAR_WIDTH * TEXT_SCALE, WIDTH))
-
+        lines = pages[page_index]
         line_height = LINE_HEIGHT
-        lines_per_screen = HEIGHT // line_height
+        top = 0
+        if header:
+            display.text(header, 0, 0, WIDTH, TEXT_SCALE)
+            top = 1
+        lines_per_screen = HEIGHT // line_height - top
         scroll = min(max(scroll, 0), max(0, len(lines) - lines_per_screen))
 
         for i in range(lines_per_screen):
             line_index = scroll + i
             if line_index >= len(lines):
                 break
-            display.text(lines[line_index], 0, i * line_height, WIDTH, TEXT_SCALE)
+            display.text(lines[line_index], 0, (i + top) * line_height, WIDTH, TEXT_SCALE)
 
         display.update()
+        # Collect between frames rather than in the middle of a fetch.  The
+        # largest-block probe would starve a fetch running on core 1 of
+        # memory, so it waits for the worker to be idle.
+        heap.frame(probe=worker is None or worker.idle())
 
+        pressed = True
         if button_x.read():
             if scroll > 0:
                 scroll = max(0, scroll - 1)
-            elif product == "ISIGMET" and pages and page_index > 0:
+            elif page_index > 0:
                 page_index -= 1
                 scroll = 0
         elif button_y.read():
             if scroll + lines_per_screen < len(lines):
                 scroll += 1
-            else:
-                if product == "ISIGMET" and pages and page_index + 1 < len(pages):
-                    page_index += 1
-                    scroll = 0
+            elif page_index + 1 < len(pages):
+                page_index += 1
+                scroll = 0
+        elif button_a.read():
+            # Jump to the next report that mentions the station
+            jump = getattr(pages, "next_mention", None)
+            target = jump(page_index) if jump else None
+            if target is not None:
+                page_index = target
+                scroll = 0
         elif button_b.read():
             break
+        else:
+            pressed = False
+
+        if pressed:
+            prefetcher.activity()
+        else:
+            # Use idle time to fetch what is likely to be opened next
+            prefetcher.poll(prefetch_fetch)
+
+        if peers and (worker is None or worker.idle()):
+            # Hear other displays' offers and hand them our copies.  That
+            # reads the last-good cache and uses the network, both the
+            # worker's while it has a job; it polls itself while fetching.
+            # Only this core submits jobs, so an idle worker stays idle here.
+            try:
+                peers.poll()
+            except Exception as e:
+                # Whatever arrives from the network must not stop the display
+                print(f"Peer poll error: {e}")
 
         time.sleep(0.1)
 
+def fetch_buffer_size():
+    """Fetch buffer big enough for every product, as text or payload."""
+    largest = max(info.get("max_bytes", 8192) for info in weather_products.values())
+    return products.stream.payload_size(largest)
+
 def main():
+    # Before anything else fills the heap: the fetch buffer and the names
+    # that are kept for the whole run
+    heap.setup((("fetch", fetch_buffer_size()),))
+    for name in weather_products:
+        heap.intern(name)
+    for station in metar_stations:
+        heap.intern(station["icao"])
     while True:
         try:
+            worker = get_worker()
+            if worker:
+                # The network stack is the worker's while it has a job
+                worker.wait_idle()
             connect_to_wifi()
             if set_rtc_from_ntp():
                 product = product_menu()
                 station = None
                 if weather_products.get(product, {}).get("needs_station"):
-                    station = station_menu()
+                    station = heap.intern(station_menu())
                 display_weather(product, station)
             else:
                 display_text(["Error: Could not set time", "Press any button"])
@@ -0,0 +1,69 @@
+# Idle-time prefetch of the product likely to be opened next.
+#
+# Someone looking at a METAR usually wants the TAF next and vice versa.
+# While a product is on screen and the buttons have been left alone for a
+# moment, the related products for the same station are fetched into the
+# product cache, as long as enough heap would stay free.  Opening one of
+# them is then instant instead of a cold fetch.
+
+import time
+
+import heap
+from products import weather_products
+
+RELATED = {
+    "METAR": ("TAF",),
+    "TAF": ("METAR",),
+}
+
+# Buttons untouched for this long counts as idle
+IDLE_MS = 3000
+# Heap that must remain free on top of the product's own fetch buffer
+HEAP_RESERVE = 32768
+
+
+class Prefetcher:
+    def __init__(self, product, station=None):
+        self.station = station
+        self.queue = []
+        self.last_input = time.ticks_ms()
+        self.plan(product)
+
+    def plan(self, product):
+        """Queue the products related to ``product`` for the same station."""
+        self.queue = list(RELATED.get(product, ()))
+
+    def activity(self):
+        """Call when a button is pressed; prefetching waits for idle time."""
+        self.last_input = time.ticks_ms()
+
+    def has_room(self, product):
+        max_bytes = weather_products[product].get("max_bytes", 8192)
+        free = heap.free()
+        if free is None:
+            return True
+        # A reserved fetch buffer is already counted as used
+        need = HEAP_RESERVE if heap.has_buffer("fetch", max_bytes) else max_bytes + HEAP_RESERVE
+        if free < need:
+            heap.collect()
+            free = heap.free()
+        return free >= need
+
+    def poll(self, fetch):
+        """Prefetch one queued product with ``fetch(product, station)`` if idle.
+
+        ``fetch`` is expected to return a cached copy without a network
+        request when it is still fresh.  Returns the product fetched, or None
+        when nothing was done.
+        """
+        if not self.queue:
+            return None
+        if time.ticks_diff(time.ticks_ms(), self.last_input) < IDLE_MS:
+            return None
+        if not self.has_room(self.queue[0]):
+            return None
+        product = self.queue.pop(0)
+        print(f"Prefetching {product} for {self.station}")
+        fetch(product, self.station)
+        self.last_input = time.ticks_ms()
+        return product
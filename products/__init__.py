@@ -0,0 +1,164 @@
+# Weather product registry.
+#
+# Each entry in ``weather_products`` holds the product's configuration (URL,
+# byte budget, server-side query) and names the module that implements its
+# pipeline.  Product modules are only imported when the product is first
+# used, and ``unload`` drops the ones that aren't on screen, so an unused
+# product costs no RAM.  Every module provides (see products/base.py for the
+# defaults):
+#
+#   fetch(url, station, info, deadline) - cleaned text, "" or None on failure
+#                                         (lines are stripped and blank ones
+#                                         dropped while streaming, see
+#                                         stream.py)
+#   paginate(text, wrap, clock, station) - list of pages of display lines
+#   CACHE_TTL_MS                        - how long a fetched copy is reused
+#   REPAGINATE_MS                       - re-layout interval (0 = on change)
+#   SHOW_CLOCK                          - draw the UTC clock above the text
+
+import sys
+
+import wire_format
+from products import stream
+
+NO_DATA = "No current data available"
+
+# Print a preview of every fetched product
+DEBUG = False
+
+# Radius for area products around the home station
+AREA_RADIUS_NM = 150
+
+# Supported weather products and their URL patterns.  If a product requires
+# a station code in the URL the string contains ``{station}`` as a placeholder.
+# "max_bytes" is the most of a response kept in memory and "chunk_size" the
+# size of each socket read.  Area products list the server-side filters they
+# use in "query" (see area_query.py); edit the values there to narrow or
+# widen what is fetched.
+weather_products = {
+    "METAR": {
+        "module": "products.metar",
+        "needs_station": True,
+        "max_bytes": 1024,
+        "chunk_size": 512,
+        "url": "http://tgftp.nws.noaa.gov/data/observations/metar/stations/{station}.TXT",
+    },
+    "TAF": {
+        "module": "products.taf",
+        "needs_station": True,
+        "max_bytes": 4096,
+        "chunk_size": 512,
+        "url": "http://tgftp.nws.noaa.gov/data/forecasts/taf/stations/{station}.TXT",
+    },
+    "AIRMET": {
+        "module": "products.airmet",
+        "needs_station": False,
+        "max_bytes": 8192,
+        "chunk_size": 1024,
+        "url": "https://aviationweather.gov/api/data/gairmet?format=raw",
+        # type: sierra/tango/zulu; hazard: turb-hi, turb-lo, llws, sfc_wind,
+        # ifr, mtn_obs, ice, fzlvl
+        "query": {"type": None, "hazard": None},
+    },
+    "SIGMET": {
+        "module": "products.sigmet",
+        "needs_station": False,
+        "max_bytes": 8192,
+        "chunk_size": 1024,
+        "url": "https://aviationweather.gov/api/data/airsigmet?format=raw&type=sigmet",
+        # hazard: conv, turb, ice, ifr; level: altitude in feet
+        "query": {"hazard": None, "level": None},
+    },
+    "PIREP": {
+        "module": "products.pirep",
+        "needs_station": False,
+        "max_bytes": 6144,
+        "chunk_size": 512,
+        "url": "https://aviationweather.gov/api/data/pirep?format=raw",
+        # Reports within AREA_RADIUS_NM of the home station from the last
+        # two hours; level: altitude in feet; inten: lgt, mod, sev
+        "query": {"id": True, "distance": AREA_RADIUS_NM, "age": 2, "level": None, "inten": None},
+    },
+    "ISIGMET": {
+        "module": "products.isigmet",
+        "needs_station": False,
+        "max_bytes": 8192,
+        "chunk_size": 1024,
+        "url": "https://aviationweather.gov/api/data/isigmet?format=raw",
+        # hazard: turb, ice; level: altitude in feet
+        "query": {"hazard": None, "level": None},
+    },
+}
+
+_loaded = {}
+# Body CRC and cleaned text of the last fetch of each product
+_seen = {}
+
+
+def load(name):
+    """Import (once) and return the pipeline module for product ``name``."""
+    module = _loaded.get(name)
+    if module is None:
+        path = weather_products[name]["module"]
+        module = __import__(path, None, None, ("paginate",))
+        _loaded[name] = module
+    return module
+
+
+def unload(keep=()):
+    """Forget product modules other than ``keep`` so their RAM can be freed."""
+    for name in list(_loaded):
+        if name not in keep:
+            del _loaded[name]
+            path = weather_products[name]["module"]
+            sys.modules.pop(path, None)
+            # The import also left the module as an attribute of this package
+            globals().pop(path.rsplit(".", 1)[-1], None)
+
+
+def fetch(name, url, station=None, deadline=None):
+    """Run product ``name``'s fetcher; cleaned text or None.
+
+    The request is conditional on the ETag of the copy fetched last time
+    from the same URL.  When the server answers 304, or the body is
+    byte-for-byte the one fetched last time (same CRC), the previous
+    cleaned text object is returned as is, so callers can tell nothing
+    changed with ``is`` and skip re-layout.
+    """
+    module = load(name)
+    seen = _seen.get(name)
+    stream.last_crc = None
+    stream.if_none_match = seen[3] if seen and seen[2] == url else None
+    try:
+        data = module.fetch(url, station, weather_products[name], deadline)
+    finally:
+        stream.if_none_match = None
+    if data is None:
+        return None
+    if data is stream.UNCHANGED:
+        print(f"{name} not modified")
+        return seen[1]
+    if data == "":
+        return NO_DATA
+    crc = stream.last_crc
+    if crc is not None and seen and seen[0] == crc:
+        print(f"{name} unchanged")
+        _seen[name] = (crc, seen[1], url, stream.last_etag)
+        return seen[1]
+    _seen[name] = (crc, data, url, stream.last_etag)
+    if DEBUG and isinstance(data, str):
+        print("Successfully fetched data:", data[:200] + "..." if len(data) > 200 else data)
+    return data
+
+
+def paginate(name, text, wrap, clock=None, station=None):
+    """Lay ``text`` out as pages of display lines for product ``name``.
+
+    ``station`` is the one the text was fetched for; pass it when that may
+    not be the last fetch of the product (the gateway lays out cached
+    copies for many stations).  A wire_format payload is already laid out
+    and is paged as it is.
+    """
+    if isinstance(text, wire_format.Payload):
+        return text.pages()
+    return load(name).paginate(text, wrap, clock, station)
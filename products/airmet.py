@@ -0,0 +1,16 @@
+# G-AIRMET raw text: one page per advisory, split the same way as SIGMETs.
+
+from products.base import *
+from products import sections
+
+CACHE_TTL_MS = 90000
+
+
+def fetch(url, station, info, deadline):
+    return sections.fetch("AIRMET", url, station, info, deadline,
+                          sections.BY_GAP, sections.advisory_start)
+
+
+def paginate(text, wrap, clock=None, station=None):
+    return sections.paginate("AIRMET", text, wrap,
+                             sections.BY_GAP, sections.advisory_start, station=station)
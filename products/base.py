@@ -0,0 +1,35 @@
+# Default pipeline pieces for products that don't need anything special.
+# Product modules start with ``from products.base import *`` and override
+# what they need.
+
+from products import stream
+
+# Long enough for a prefetched copy (refreshed with the product on screen
+# every 2 minutes) to still be used, but no older than the display's STALE
+# mark (refresh interval + 30 s), which a healthy network must never show
+CACHE_TTL_MS = 150000
+REPAGINATE_MS = 0
+SHOW_CLOCK = True
+
+
+def fetch(url, station, info, deadline):
+    """Stream the product within its byte budget."""
+    return stream.fetch_stream(
+        url,
+        station,
+        max_size=info.get("max_bytes", 8192),
+        chunk_size=info.get("chunk_size", 1024),
+        deadline=deadline,
+    )
+
+
+def paginate(text, wrap, clock=None, station=None):
+    """One page holding every line of ``text``, wrapped.
+
+    ``station`` is the one the text was fetched for, for products that pick
+    out its reports; by default the station of the last fetch.
+    """
+    lines = []
+    for raw in text.split("\n"):
+        lines.extend(wrap(raw))
+    return [lines]
@@ -0,0 +1,34 @@
+# International SIGMETs: one page per report, U.S. reports first.
+
+from products.base import *
+from products import NO_DATA
+
+CACHE_TTL_MS = 90000
+SHOW_CLOCK = False
+
+
+def paginate(text, wrap, clock=None, station=None):
+    """Split ISIGMET data into pages and reorder US pages first."""
+    import re
+
+    if text == NO_DATA:
+        return [["No active ISIGMETs"]]
+    pages = [p.strip() for p in text.split("----------------------") if p.strip()]
+    if not pages:
+        return [["No active ISIGMETs"]]
+
+    def has_us_identifier(text):
+        return re.search(r"\bK[A-Z]{3}\b", text) is not None
+
+    us_pages = [p for p in pages if has_us_identifier(p)]
+    other_pages = [p for p in pages if not has_us_identifier(p)]
+    ordered_pages = us_pages + other_pages
+
+    # Split each page into wrapped lines
+    wrapped_pages = []
+    for page in ordered_pages:
+        lines = []
+        for raw in page.split("\n"):
+            lines.extend(wrap(raw))
+        wrapped_pages.append(lines)
+    return wrapped_pages
@@ -0,0 +1,30 @@
+# METAR: a few lines per station, shown as a single page, followed by the
+# pressure and ceiling trend from the station's stored history.
+
+from products.base import *
+from products import base
+import metar_decode
+import obs_history
+
+
+def fetch(url, station, info, deadline):
+    text = base.fetch(url, station, info, deadline)
+    if text and text is not stream.UNCHANGED and station:
+        if isinstance(text, str):
+            obs_history.record(station, text)
+        elif text.fields():
+            # A pre-laid-out payload carries the decoded report
+            obs_history.record_fields(station, text.fields())
+    return text
+
+
+def paginate(text, wrap, clock=None, station=None):
+    pages = base.paginate(text, wrap, clock)
+    report = metar_decode.find_report(text)
+    if report:
+        trend = obs_history.trend(report.split()[0])
+        if trend:
+            pages[0].append("")
+            for line in trend:
+                pages[0].extend(wrap(line))
+    return pages
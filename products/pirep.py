@@ -0,0 +1,14 @@
+# PIREP: one report per line around the home station, one report per page.
+
+from products.base import *
+from products import sections
+
+CACHE_TTL_MS = 90000
+
+
+def fetch(url, station, info, deadline):
+    return sections.fetch("PIREP", url, station, info, deadline, sections.BY_LINE)
+
+
+def paginate(text, wrap, clock=None, station=None):
+    return sections.paginate("PIREP", text, wrap, sections.BY_LINE, station=station)
@@ -0,0 +1,250 @@
+# Report index for long area products (PIREP, SIGMET, AIRMET).
+#
+# While a product streams in (see stream.compact_lines) every kept line is
+# offered to a Sections object, which records the byte offset where each
+# report starts and whether the report mentions the home station.  The
+# display then shows one report per page and only wraps the page on
+# screen, and "next report mentioning the station" is a table lookup.
+
+from array import array
+
+from products import stream
+
+# How reports are told apart: every line is a report, or a report runs
+# until a blank line (or a line the product's ``starts`` test accepts)
+BY_LINE = 0
+BY_GAP = 1
+
+# Results of a ``starts`` test: the line continues the current report,
+# starts a new one, or is a bulletin heading that starts a new one and
+# takes the advisory title that follows with it
+CONTINUES = 0
+STARTS = 1
+HEADING = 2
+
+ADVISORY_TITLES = (b"CONVECTIVE SIGMET", b"SIGMET ", b"AIRMET ", b"OUTLOOK VALID")
+
+
+def _is_word_byte(c):
+    return 48 <= c <= 57 or 65 <= c <= 90 or 97 <= c <= 122
+
+
+def _starts_with(buffer, key, a, b):
+    if b - a < len(key):
+        return False
+    for j in range(len(key)):
+        if buffer[a + j] != key[j]:
+            return False
+    return True
+
+
+def _find(buffer, key, a, b):
+    """``buffer.find(key, a, b)``; MicroPython's bytearray has no find()."""
+    last = b - len(key)
+    i = stream.find_byte(buffer, key[0], a, last + 1)
+    while i >= 0:
+        if _starts_with(buffer, key, i, b):
+            return i
+        i = stream.find_byte(buffer, key[0], i + 1, last + 1)
+    return -1
+
+
+def _contains_word(buffer, key, a, b):
+    i = _find(buffer, key, a, b)
+    while i >= 0:
+        end = i + len(key)
+        if (i == a or not _is_word_byte(buffer[i - 1])) and (end == b or not _is_word_byte(buffer[end])):
+            return True
+        i = _find(buffer, key, end, b)
+    return False
+
+
+def _is_upper(buffer, a, b):
+    for i in range(a, b):
+        if not 65 <= buffer[i] <= 90:
+            return False
+    return True
+
+
+def _is_digits(buffer, a, b):
+    for i in range(a, b):
+        if not 48 <= buffer[i] <= 57:
+            return False
+    return True
+
+
+def advisory_start(buffer, a, b):
+    """``starts`` test for SIGMET/AIRMET bulletins.
+
+    A WMO heading line ("WSUS32 KKCI 011655") is a HEADING; a line opening
+    with an advisory title ("CONVECTIVE SIGMET 12C", "AIRMET SIERRA ...")
+    STARTS a new advisory.
+    """
+    if (b - a >= 11 and buffer[a + 6] == 32 and _is_upper(buffer, a, a + 4)
+            and _is_digits(buffer, a + 4, a + 6) and _is_upper(buffer, a + 7, a + 11)):
+        return HEADING
+    for title in ADVISORY_TITLES:
+        if _starts_with(buffer, title, a, b):
+            return STARTS
+    return CONTINUES
+
+
+def station_keys(station):
+    """Ways a station appears in report text: "KBNA" and "BNA"."""
+    if not station:
+        return ()
+    code = station.upper().encode()
+    return (code, code[1:]) if len(code) == 4 else (code,)
+
+
+class Sections:
+    def __init__(self, mode=BY_LINE, station=None, starts=None):
+        self.mode = mode
+        self.keys = station_keys(station)
+        self.starts_test = starts
+        self.starts = array("I")
+        self.mentioned = bytearray()
+        self.next_mention = array("h")
+        self.size = 0
+        self.gap = True
+        self.heading = False
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, buffer, a, b):
+        """Record the kept line ``buffer[a:b]``."""
+        kind = self.starts_test(buffer, a, b) if self.starts_test is not None else CONTINUES
+        if kind == HEADING or self.mode == BY_LINE or not len(self.starts):
+            new = True
+        else:
+            # Nothing splits a heading from the advisory title under it
+            new = (self.gap or kind == STARTS) and not self.heading
+        if new:
+            self.starts.append(a)
+            self.mentioned.append(0)
+        if kind == HEADING:
+            self.heading = True
+        elif kind == STARTS:
+            self.heading = False
+        self.gap = False
+        if self.mentioned[-1]:
+            return
+        for key in self.keys:
+            if _contains_word(buffer, key, a, b):
+                self.mentioned[-1] = 1
+                break
+
+    def finish(self, size):
+        """Drop reports past ``size`` (the kept text) and build the jump table."""
+        self.size = size
+        # MicroPython's array and bytearray have no pop()
+        n = len(self.starts)
+        while n and self.starts[n - 1] >= size:
+            n -= 1
+        if n < len(self.starts):
+            self.starts = self.starts[:n]
+            self.mentioned = self.mentioned[:n]
+        # next_mention[i]: the next report after i (wrapping round) that
+        # mentions the station, or -1
+        n = len(self.starts)
+        self.next_mention = array("h", [-1] * n)
+        following = -1
+        for i in range(2 * n - 1, -1, -1):
+            if i < n:
+                self.next_mention[i] = following
+            if self.mentioned[i % n]:
+                following = i % n
+
+    def span(self, i):
+        end = self.starts[i + 1] - 1 if i + 1 < len(self.starts) else self.size
+        return self.starts[i], end
+
+
+def build(text, mode=BY_LINE, station=None, starts=None):
+    """Index text that didn't come through ``fetch`` (e.g. from the cache)."""
+    data = text.encode()
+    index = Sections(mode, station, starts)
+    pos = 0
+    while pos < len(data):
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            nl = len(data)
+        if nl > pos:
+            index.line(data, pos, nl)
+        pos = nl + 1
+    index.finish(len(data))
+    return index
+
+
+class SectionPages:
+    """One page per report, wrapped only when it is looked at."""
+
+    def __init__(self, text, index, wrap):
+        # Offsets are in bytes; slice the encoded text if they differ
+        self.source = text if len(text) == index.size else text.encode()
+        self.index = index
+        self.wrap = wrap
+        self._page = -1
+        self._lines = None
+
+    def __len__(self):
+        return max(len(self.index), 1)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i != self._page:
+            if len(self.index):
+                a, b = self.index.span(i)
+                text = self.source[a:b]
+            else:
+                text = self.source
+            if not isinstance(text, str):
+                text = str(text, "utf-8")
+            lines = []
+            for raw in text.split("\n"):
+                lines.extend(self.wrap(raw))
+            self._page, self._lines = i, lines
+        return self._lines
+
+    def next_mention(self, i):
+        """Page of the next report mentioning the station, or None."""
+        if not len(self.index):
+            return None
+        target = self.index.next_mention[i]
+        return None if target < 0 else target
+
+
+# Index of the last fetch of each product, by name
+_indexes = {}
+
+
+def fetch(name, url, station, info, deadline, mode=BY_LINE, starts=None):
+    """Stream a product, indexing its reports on the way in."""
+    index = Sections(mode, station, starts)
+    text = stream.fetch_stream(
+        url,
+        station,
+        max_size=info.get("max_bytes", 8192),
+        chunk_size=info.get("chunk_size", 1024),
+        deadline=deadline,
+        sections=index,
+    )
+    if isinstance(text, str) and text and text is not stream.UNCHANGED:
+        _indexes[name] = (text, index, station)
+    return text
+
+
+def paginate(name, text, wrap, mode=BY_LINE, starts=None, station=None):
+    """One page per report; reports mention ``station``, by default the
+    station of the last fetch."""
+    last = _indexes.get(name)
+    if station is None and last is not None:
+        station = last[2]
+    if last is not None and last[2] == station and (last[0] is text or last[0] == text):
+        index = last[1]
+    else:
+        index = build(text, mode, station, starts)
+        _indexes[name] = (text, index, station)
+    return SectionPages(text, index, wrap)
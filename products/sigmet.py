@@ -0,0 +1,17 @@
+# Domestic SIGMETs: one page per advisory.  Advisories are told apart by
+# blank lines and by their headings and titles as they stream in.
+
+from products.base import *
+from products import sections
+
+CACHE_TTL_MS = 90000
+
+
+def fetch(url, station, info, deadline):
+    return sections.fetch("SIGMET", url, station, info, deadline,
+                          sections.BY_GAP, sections.advisory_start)
+
+
+def paginate(text, wrap, clock=None, station=None):
+    return sections.paginate("SIGMET", text, wrap,
+                             sections.BY_GAP, sections.advisory_start, station=station)
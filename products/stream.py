@@ -0,0 +1,284 @@
+# Bounded, streamed HTTP fetch shared by every product.
+
+import http_client
+import endpoint_cache
+import heap
+import wire_format
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+# Last line of a product that was larger than its "max_bytes" budget
+TRUNCATED_NOTE = "[truncated]"
+
+# CRC of the body kept by the last fetch_stream call, None if it failed.
+# products.fetch compares it with the previous fetch to skip unchanged text.
+last_crc = None
+
+# Conditional requests: products.fetch sets ``if_none_match`` to the ETag of
+# the copy it already has, and fetch_stream leaves the ETag of what it got
+# in ``last_etag``.  A 304 answer returns UNCHANGED instead of the text.
+if_none_match = None
+last_etag = None
+UNCHANGED = "\0unchanged"
+
+# Characters per display line.  When set, servers that can (gateway.py) are
+# asked for a pre-laid-out wire_format payload instead of raw text.
+wire_width = None
+
+HEADERS = {
+    'User-Agent': 'Pico-METAR-Display/1.0',
+    'Accept': 'text/plain'
+}
+
+
+def _header(response, name):
+    headers = getattr(response, "headers", None) or {}
+    name = name.lower()
+    for key in headers:
+        if key.lower() == name:
+            return headers[key]
+    return None
+
+
+def _content_length(response):
+    try:
+        return int(_header(response, "Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+
+def open_weather_url(template, station=None, deadline=None):
+    """Open a product URL through the endpoint capability cache."""
+    headers = HEADERS
+    if if_none_match or wire_width:
+        headers = dict(HEADERS)
+        if if_none_match:
+            headers["If-None-Match"] = if_none_match
+        if wire_width:
+            headers[wire_format.WIDTH_HEADER] = str(wire_width)
+
+    def request(url):
+        print(f"Trying URL: {url}")
+        return http_client.get(url, headers, deadline)
+
+    return endpoint_cache.open_endpoint(template, station, request)
+
+
+def find_byte(buffer, value, a, b):
+    """Index of the byte ``value`` in ``buffer[a:b]``, or -1.
+
+    MicroPython's bytearray has no find(), so receive buffers are scanned
+    by hand.
+    """
+    while a < b:
+        if buffer[a] == value:
+            return a
+        a += 1
+    return -1
+
+
+def rfind_byte(buffer, value, a, b):
+    """Index of the last byte ``value`` in ``buffer[a:b]``, or -1."""
+    b -= 1
+    while b >= a:
+        if buffer[b] == value:
+            return b
+        b -= 1
+    return -1
+
+
+def compact_lines(buffer, view, out, pos, end, sections=None):
+    """Normalise the complete lines in ``buffer[pos:end]`` in place.
+
+    Each line is stripped of surrounding whitespace and moved down to
+    ``out``; blank lines are dropped.  Returns ``(out, pos)``: the new end
+    of the cleaned text and the start of the unfinished last line.  Kept
+    lines are passed on to ``sections`` (see sections.py) when given.
+    """
+    while True:
+        nl = find_byte(buffer, 10, pos, end)
+        if nl < 0:
+            return out, pos
+        a, b = pos, nl
+        # Spaces, tabs and \r are all <= 32
+        while a < b and buffer[a] <= 32:
+            a += 1
+        while b > a and buffer[b - 1] <= 32:
+            b -= 1
+        if b > a:
+            if out != a:
+                view[out:out + b - a] = view[a:b]
+            if sections is not None:
+                sections.line(buffer, out, out + b - a)
+            out += b - a
+            buffer[out] = 10
+            out += 1
+        elif sections is not None:
+            sections.gap = True
+        pos = nl + 1
+
+
+def payload_size(max_size):
+    """Buffer needed for a wire_format payload of a ``max_size`` product:
+    room for the line and page tables on top of the text."""
+    return max_size * 5 // 4
+
+
+def read_payload(response, deadline, max_size, chunk_size):
+    """Read a wire_format payload body; ``(Payload, crc)`` or ``(None, None)``."""
+    buffer = heap.buffer("fetch", max_size)
+    view = memoryview(buffer)
+    size = 0
+    crc = 0
+    for chunk in http_client.read_chunks(response, deadline, chunk_size):
+        if size + len(chunk) > max_size:
+            # A cut-off payload is useless
+            print(f"Payload larger than {max_size} bytes")
+            return None, None
+        view[size:size + len(chunk)] = chunk
+        if crc32 is not None:
+            crc = crc32(chunk, crc)
+        size += len(chunk)
+    try:
+        # The fetch buffer is reused, so the payload gets its own copy
+        payload = wire_format.Payload(bytes(view[:size]))
+    except ValueError as e:
+        print(f"Bad payload: {e}")
+        return None, None
+    print(f"Fetched payload: {size} bytes, {payload.page_count} pages")
+    return payload, crc if crc32 is not None else hash(bytes(view[:size]))
+
+
+def fetch_stream(template, station=None, max_size=8192, chunk_size=1024, deadline=None,
+                 sections=None):
+    """Stream a product body into a buffer of at most ``max_size`` bytes.
+
+    This is the only fetch path, so peak memory is the buffer plus one chunk
+    whatever the product.  Lines are stripped and blank lines dropped as the
+    chunks arrive (see ``compact_lines``), so the buffer ends up holding the
+    final text and ``max_size`` limits the cleaned size.  A body that
+    doesn't fit is cut back to the last complete line and ends with a
+    TRUNCATED_NOTE line.  Returns the text, "" when the server has no data
+    (404) or sent an empty body, or None on failure, including running out
+    of memory.  The CRC of the body is worked out chunk
+    by chunk as it arrives and left in ``last_crc``.  A ``sections`` index
+    is filled in with the reports' offsets in the returned text.  A server
+    answering with a wire_format payload (see ``wire_width``) gets a
+    wire_format.Payload back instead of text.
+    """
+    global last_crc, last_etag
+    last_crc = None
+    last_etag = None
+    if deadline is None:
+        deadline = http_client.Deadline()
+    try:
+        response = open_weather_url(template, station, deadline)
+        if response is None:
+            return None
+        # Closed on every path, including errors part way through
+        with response:
+            if response.status_code == 304:
+                print("Not modified")
+                last_etag = if_none_match
+                return UNCHANGED
+            if response.status_code == 404:
+                # The host is fine, the station just has no such product:
+                # an answer, not a failure to retry or count against it
+                print("No data (404)")
+                return ""
+            if response.status_code != 200:
+                print(f"HTTP error {response.status_code}")
+                return None
+
+            expected = _content_length(response)
+            last_etag = _header(response, "ETag")
+            if wire_width and _header(response, "Content-Type") == wire_format.CONTENT_TYPE:
+                payload, last_crc = read_payload(response, deadline, payload_size(max_size), chunk_size)
+                return payload
+            # Reserved once and reused (see heap.py); the text is copied out
+            buffer = heap.buffer("fetch", max_size)
+            view = memoryview(buffer)
+            out = 0        # end of the cleaned text
+            pos = 0        # start of the line still being received
+            size = 0       # end of the received bytes
+            received = 0
+            crc = 0
+            truncated = False
+            for chunk in http_client.read_chunks(response, deadline, chunk_size):
+                received += len(chunk)
+                if crc32 is not None:
+                    crc = crc32(chunk, crc)
+                chunk = memoryview(chunk)
+                offset = 0
+                while offset < len(chunk):
+                    take = min(len(chunk) - offset, max_size - size)
+                    if not take:
+                        truncated = True
+                        break
+                    view[size:size + take] = chunk[offset:offset + take]
+                    size += take
+                    offset += take
+                    out, pos = compact_lines(buffer, view, out, pos, size, sections)
+                    if pos > out:
+                        # Slide the unfinished line down behind the clean text
+                        view[out:out + size - pos] = view[pos:size]
+                        size -= pos - out
+                        pos = out
+                if truncated:
+                    break
+
+        if not truncated and expected is not None and received < expected:
+            # The server closed the connection part way through
+            print(f"Body ended after {received} of {expected} bytes")
+            return None
+
+        if truncated:
+            # Don't show a report cut off mid-line, and leave room for the note
+            note = b"\n" + TRUNCATED_NOTE.encode()
+            if out + len(note) > max_size:
+                out = rfind_byte(buffer, 10, 0, max_size - len(note)) + 1
+            if sections is not None:
+                # Forget reports that were cut off; the note joins the last
+                sections.finish(out)
+            if out:
+                out -= 1
+            else:
+                note = note[1:]
+            view[out:out + len(note)] = note
+            out += len(note)
+            print(f"{template} larger than {max_size} bytes, truncated")
+        else:
+            # The last line has no newline after it
+            while pos < size and buffer[pos] <= 32:
+                pos += 1
+            while size > pos and buffer[size - 1] <= 32:
+                size -= 1
+            if size > pos:
+                view[out:out + size - pos] = view[pos:size]
+                if sections is not None:
+                    sections.line(buffer, out, out + size - pos)
+                out += size - pos
+            elif out:
+                out -= 1
+        if sections is not None:
+            if not truncated:
+                sections.finish(out)
+            sections.size = out
+        text = str(view[:out], "utf-8")
+        print(f"Fetched data: {received} bytes, kept {out}")
+        last_crc = crc if crc32 is not None else hash(text)
+        return text
+
+    except MemoryError:
+        # A failed attempt, not an empty product: the last good copy stays
+        print("Memory allocation failed")
+        return None
+    except http_client.DeadlineExceeded as e:
+        print(f"Request cancelled: {e}")
+        return None
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        return None
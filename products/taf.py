@@ -0,0 +1,26 @@
+# TAF: parsed into change groups so the period in effect is shown first.
+
+from products.base import *
+import taf_parser
+
+# The current period moves on with the clock even when the text doesn't
+REPAGINATE_MS = 60000
+
+# Parsed groups for the text last laid out, so the periodic re-layout only
+# looks up the current period instead of parsing again
+_taf = None
+_source = None
+
+
+def paginate(text, wrap, clock=None, station=None):
+    global _taf, _source
+    if text is not _source:
+        _taf = taf_parser.parse(text)
+        _source = text
+    if clock is not None and len(_taf):
+        day, hour, minute = clock()
+        text = _taf.summary(_taf.minutes(day, hour, minute))
+    lines = []
+    for raw in text.split("\n"):
+        lines.extend(wrap(raw))
+    return [lines]
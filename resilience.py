@@ -0,0 +1,114 @@
+# Per-host retry policy for weather fetches.
+#
+# Failed attempts back off exponentially with jitter.  After repeated
+# failures a host's circuit opens and we stop hitting it for a while,
+# serving the last good data instead so the display stays responsive
+# while NOAA is down.  After the cool-down one trial request is let
+# through (half-open); success closes the circuit, failure reopens it for
+# twice as long.
+
+import time
+import random
+
+BASE_DELAY_MS = 500
+MAX_DELAY_MS = 8000
+FAILURE_THRESHOLD = 3
+OPEN_MS = 60000
+MAX_OPEN_MS = 600000
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.open_ms = OPEN_MS
+
+    def allow(self):
+        """True when a request may be attempted (closed or half-open)."""
+        if self.opened_at is None:
+            return True
+        return time.ticks_diff(time.ticks_ms(), self.opened_at) >= self.open_ms
+
+    def is_open(self):
+        return not self.allow()
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.open_ms = OPEN_MS
+
+    def failure(self):
+        self.failures += 1
+        if self.opened_at is not None:
+            # Trial request after the cool-down failed; back off harder
+            self.open_ms = min(self.open_ms * 2, MAX_OPEN_MS)
+            self.opened_at = time.ticks_ms()
+        elif self.failures >= FAILURE_THRESHOLD:
+            print(f"Circuit open for {self.open_ms // 1000}s")
+            self.opened_at = time.ticks_ms()
+
+
+_breakers = {}
+_last_good = {}
+
+
+def host_of(url):
+    return url.split("://", 1)[-1].split("/", 1)[0]
+
+
+def breaker(host):
+    b = _breakers.get(host)
+    if b is None:
+        b = _breakers[host] = CircuitBreaker()
+    return b
+
+
+def backoff_ms(attempt):
+    """Delay before retry number ``attempt`` (0-based), with equal jitter."""
+    delay = min(MAX_DELAY_MS, BASE_DELAY_MS << attempt)
+    half = delay // 2
+    return half + random.getrandbits(16) % (half + 1)
+
+
+def store(key, data, age_ms=0):
+    _last_good[key] = (data, time.ticks_add(time.ticks_ms(), -age_ms))
+
+
+def last_good(key):
+    """Return ``(data, age_ms)`` for the last successful fetch of ``key``."""
+    entry = _last_good.get(key)
+    if entry is None:
+        return None, None
+    data, stamp = entry
+    return data, time.ticks_diff(time.ticks_ms(), stamp)
+
+
+def call(host, fetch, key, max_attempts=3):
+    """Run ``fetch()`` under ``host``'s circuit breaker.
+
+    ``fetch`` returns data or None (or raises) on failure.  Only failures
+    count against the host, so an answer meaning "no data here" (a 404)
+    must come back as data, not None, or a station without a TAF would
+    open the circuit for every product on that host.  Returns
+    ``(data, stale_age_ms)``: fresh data has an age of None, otherwise the
+    last good data for ``key`` is returned with its age, or ``(None, None)``
+    when there is nothing to fall back on.
+    """
+    b = breaker(host)
+    for attempt in range(max_attempts):
+        if not b.allow():
+            print(f"Circuit open for {host}, skipping fetch")
+            break
+        try:
+            data = fetch()
+        except Exception as e:
+            print(f"Fetch error from {host}: {e}")
+            data = None
+        if data is not None:
+            b.success()
+            store(key, data)
+            return data, None
+        b.failure()
+        if attempt + 1 < max_attempts and b.allow():
+            time.sleep(backoff_ms(attempt) / 1000)
+    return last_good(key)
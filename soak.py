@@ -0,0 +1,550 @@
+"""Soak the Pico display code through days of virtual time.
+
+Run this on a computer (CPython):
+
+    python soak.py --days 7
+    python soak.py --days 2 --entry display --product PIREP --error-rate 0.1 --json soak.json
+
+pico_version.py runs unchanged on the board stand-ins from hostshims.py,
+under a virtual clock.  Every ``time.sleep`` moves the clock on instead of
+waiting (by ``--sleep-scale`` times the time asked for, so the display loop
+takes fewer, longer steps).  Requests are answered in-process from
+standin_server.py's generated reports after a drawn latency, with the same
+kinds of faults.  NTP answers come from the virtual clock while the RTC runs
+``--rtc-drift-ppm`` fast, and a scripted user presses buttons now and then.
+A week of two-minute refreshes, NTP syncs and button presses then takes a
+few minutes.
+
+Every virtual hour the heap (allocated blocks, live objects and, with
+``--tracemalloc``, traced bytes), open responses and file descriptors are
+sampled.  The run fails (exit status 1) when, after the first day:
+
+- heap blocks or objects keep growing;
+- responses are left open or leaked;
+- descriptors pile up;
+- the RTC is further than ``--max-rtc-error-ms`` off at an NTP sync;
+- refreshes drift from REFRESH_MS by more than ``--max-drift-pct``;
+- a buffer reserved at boot (see heap.py) had to be allocated again.
+
+The device's own output goes to ``--log`` (default: discarded).
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import socket
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from contextlib import redirect_stdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import hostshims  # noqa: E402
+import standin_server  # noqa: E402
+
+NTP_DELTA = 2208988800
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+PINS = {"a": 12, "b": 13, "x": 14, "y": 15}
+
+
+class SoakOver(BaseException):
+    """Raised out of the device code when the virtual time is up."""
+
+
+class VirtualClock:
+    """Milliseconds since the start of the soak, moved on by sleeping."""
+
+    def __init__(self, start_epoch, end_ms, sleep_scale=1):
+        self.now_ms = 0.0
+        self.start_epoch = start_epoch
+        self.end_ms = end_ms
+        self.sleep_scale = sleep_scale
+        self.hooks = []
+
+    def ticks_ms(self):
+        return int(self.now_ms) % hostshims.TICKS_PERIOD
+
+    def epoch(self):
+        return self.start_epoch + self.now_ms / 1000
+
+    def advance(self, ms):
+        self.now_ms += ms
+        for hook in self.hooks:
+            hook(self.now_ms)
+        if self.now_ms >= self.end_ms:
+            raise SoakOver()
+
+    def sleep(self, seconds):
+        self.advance(seconds * 1000 * self.sleep_scale)
+
+    def sleep_ms(self, ms):
+        self.advance(ms * self.sleep_scale)
+
+    def install(self):
+        time.ticks_ms = self.ticks_ms
+        time.ticks_diff = hostshims.ticks_diff
+        time.ticks_add = hostshims.ticks_add
+        time.sleep = self.sleep
+        time.sleep_ms = self.sleep_ms
+
+
+class SoakRaw:
+    def __init__(self, response):
+        self.response = response
+        self.timeout_s = None
+
+    def settimeout(self, seconds):
+        self.timeout_s = seconds
+
+    def read(self, size=-1):
+        return self.response._read(size)
+
+
+class SoakResponse:
+    def __init__(self, network, status, body, headers, stall):
+        self.network = network
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+        self.pos = 0
+        self.stall_at = len(body) // 2 if stall else None
+        self.closed = False
+        self.raw = SoakRaw(self)
+
+    def _read(self, size):
+        end = len(self.body) if size is None or size < 0 else self.pos + size
+        if self.stall_at is not None:
+            if self.pos >= self.stall_at:
+                # The server stops sending; the socket timeout fires
+                self.network.clock.advance((self.raw.timeout_s or 1) * 1000)
+                raise OSError(110, "ETIMEDOUT")
+            end = min(end, self.stall_at)
+        chunk = self.body[self.pos:end]
+        self.pos += len(chunk)
+        return chunk
+
+    @property
+    def text(self):
+        return str(self._read(-1), "utf-8")
+
+    @property
+    def content(self):
+        return self._read(-1)
+
+    def close(self):
+        if self.closed:
+            self.network.stats["double_closes"] += 1
+            return
+        self.closed = True
+        self.network.open -= 1
+
+
+class Network:
+    """``urequests`` stand-in answering from standin_server's reports."""
+
+    def __init__(self, clock, rng, args):
+        self.clock = clock
+        self.rng = rng
+        self.args = args
+        self.open = 0
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "errors": 0,
+                      "failures": 0, "stalls": 0, "double_closes": 0}
+        self.refresh_ms = None
+        # request path -> [last asked, requests, refresh-like gaps, their total]
+        self.paths = {}
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        args = self.args
+        self.stats["requests"] += 1
+        path = "/" + url.partition("://")[2].partition("/")[2]
+        self._count(path)
+        self.clock.advance(args.latency_ms + self.rng.uniform(0, args.jitter_ms))
+        if self.rng.random() < args.failure_rate:
+            self.stats["failures"] += 1
+            raise OSError(104, "ECONNRESET")
+        stall = False
+        if self.rng.random() < args.error_rate:
+            self.stats["errors"] += 1
+            status, body, etag = self.rng.choice((500, 502, 503)), b"", None
+        else:
+            period_start = int(self.clock.epoch() // args.update_s * args.update_s)
+            text = standin_server.body_for(path.split("?")[0], period_start, args.size)
+            if text is None:
+                status, body, etag = 404, b"", None
+            else:
+                body = text.encode()
+                etag = '"%08x"' % (hash(body) & 0xFFFFFFFF)
+                if (headers or {}).get("If-None-Match") == etag:
+                    self.stats["not_modified"] += 1
+                    status, body = 304, b""
+                else:
+                    self.stats["ok"] += 1
+                    status = 200
+                    stall = self.rng.random() < args.stall_rate
+                    self.stats["stalls"] += stall
+        response_headers = {"Content-Length": str(len(body)), "Content-Type": "text/plain"}
+        if etag:
+            response_headers["ETag"] = etag
+        self.open += 1
+        return SoakResponse(self, status, body, response_headers, stall)
+
+    def _count(self, path):
+        now = self.clock.now_ms
+        entry = self.paths.get(path)
+        if entry is None:
+            self.paths[path] = [now, 1, 0, 0.0]
+            return
+        gap = now - entry[0]
+        entry[0] = now
+        entry[1] += 1
+        # Retries come sooner and time in the menus later; leave both out
+        if self.refresh_ms and self.refresh_ms // 2 <= gap < 2 * self.refresh_ms:
+            entry[2] += 1
+            entry[3] += gap
+
+
+class NtpSocket:
+    def __init__(self, soak):
+        self.soak = soak
+
+    def settimeout(self, seconds):
+        pass
+
+    def sendto(self, message, addr):
+        self.addr = addr
+
+    def recvfrom(self, size):
+        soak = self.soak
+        soak.clock.advance(soak.args.latency_ms)
+        if soak.rng.random() < soak.args.failure_rate:
+            raise OSError(110, "ETIMEDOUT")
+        now = soak.clock.epoch()
+        soak.rtc_synced(abs(hostshims.rtc_time() - now) * 1000)
+        fields = [0] * 10 + [int(now) + NTP_DELTA, 0]
+        return struct.pack("!12I", *fields), self.addr
+
+    def close(self):
+        pass
+
+
+class NtpSockets:
+    """The parts of the socket module pico_version's NTP client uses."""
+    AF_INET = socket.AF_INET
+    SOCK_DGRAM = socket.SOCK_DGRAM
+
+    def __init__(self, soak):
+        self.soak = soak
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_DGRAM, 0, "", ("127.0.0.1", port))]
+
+    def socket(self, *args):
+        return NtpSocket(self.soak)
+
+
+class User:
+    """Bursts of button presses at random moments, mostly scrolling."""
+
+    def __init__(self, rng, mean_gap_ms, hold_ms, weights):
+        self.rng = rng
+        self.mean_gap_ms = mean_gap_ms
+        self.hold_ms = hold_ms
+        self.buttons = list(weights)
+        self.weights = list(weights.values())
+        self.burst = 0
+        self.next_ms = rng.expovariate(1 / mean_gap_ms)
+        self.presses = dict.fromkeys(PINS, 0)
+
+    def __call__(self, now_ms):
+        if now_ms < self.next_ms:
+            return
+        if not self.burst:
+            self.burst = self.rng.randint(1, 6)
+        button = self.rng.choices(self.buttons, self.weights)[0]
+        hostshims.press(PINS[button], self.hold_ms)
+        self.presses[button] += 1
+        self.burst -= 1
+        if self.burst:
+            # Far enough apart to read as separate presses
+            self.next_ms = now_ms + 3 * self.hold_ms
+        else:
+            self.next_ms = now_ms + self.rng.expovariate(1 / self.mean_gap_ms)
+
+
+def open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class Sampler:
+    """Takes the hourly samples.
+
+    They go into arrays sized for the whole run up front, so the harness
+    doesn't add heap growth of its own to what it measures.
+    """
+    COLUMNS = ("hour", "blocks", "objects", "traced", "traced_peak",
+               "responses_open", "sockets_open", "fds", "requests")
+
+    def __init__(self, soak, every_ms=HOUR_MS):
+        self.soak = soak
+        self.every_ms = every_ms
+        self.next_ms = 0
+        capacity = int(soak.clock.end_ms // every_ms) + 2
+        self.columns = {name: array("d", bytes(8 * capacity)) for name in self.COLUMNS}
+        self.count = 0
+
+    def __call__(self, now_ms):
+        if now_ms < self.next_ms or self.count == len(self.columns["hour"]):
+            return
+        self.next_ms = now_ms + self.every_ms
+        import http_client
+        import tracemalloc
+        i = self.count
+        c = self.columns
+        c["hour"][i] = now_ms / HOUR_MS
+        c["blocks"][i] = sys.getallocatedblocks()
+        c["objects"][i] = len(gc.get_objects())
+        c["responses_open"][i] = http_client.open_count()
+        c["sockets_open"][i] = self.soak.network.open
+        c["fds"][i] = open_fds() or -1
+        c["requests"][i] = self.soak.network.stats["requests"]
+        if tracemalloc.is_tracing():
+            c["traced"][i], c["traced_peak"][i] = tracemalloc.get_traced_memory()
+        else:
+            c["traced"][i] = c["traced_peak"][i] = -1
+        self.count = i + 1
+
+    @property
+    def samples(self):
+        result = []
+        for i in range(self.count):
+            sample = {}
+            for name, values in self.columns.items():
+                value = values[i]
+                if value >= 0:
+                    sample[name] = round(value, 2) if name == "hour" else int(value)
+            result.append(sample)
+        return result
+
+
+class LogCounter:
+    """Passes device output on to a file, counting error lines."""
+
+    def __init__(self, out):
+        self.out = out
+        self.errors = 0
+
+    def write(self, text):
+        if "error" in text.lower():
+            self.errors += text.count("\n") or 1
+        if self.out is not None:
+            self.out.write(text)
+        return len(text)
+
+    def flush(self):
+        if self.out is not None:
+            self.out.flush()
+
+
+class Soak:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.clock = VirtualClock(args.start or time.time(), args.days * DAY_MS, args.sleep_scale)
+        self.network = Network(self.clock, self.rng, args)
+        self.rtc_syncs = 0
+        self.rtc_error_max = 0.0
+        # Each press is held long enough for one display loop step to see it
+        hold_ms = 150 * args.sleep_scale
+        weights = {"x": 3, "y": 4, "a": 2, "b": 1 if args.entry == "main" else 0.2}
+        self.user = User(self.rng, args.press_gap_min * 60000, hold_ms, weights)
+        self.sampler = Sampler(self)
+        self.clock.hooks = [self.user, self.sampler]
+
+    def rtc_synced(self, error_ms):
+        # The first sync sets a clock that was never set
+        if self.rtc_syncs:
+            self.rtc_error_max = max(self.rtc_error_max, error_ms)
+        self.rtc_syncs += 1
+
+    def install(self):
+        args = self.args
+        os.environ["TZ"] = "UTC"
+        time.tzset()
+        self.clock.install()
+        sys.modules["urequests"] = self.network
+        hostshims.install()
+        hostshims.install_hardware()
+        clock = self.clock
+        hostshims.wall_time = lambda: clock.epoch() + clock.now_ms * args.rtc_drift_ppm / 1e9
+        socket.getaddrinfo = lambda host, port, *a, **k: [
+            (socket.AF_INET, socket.SOCK_STREAM, 0, "", ("127.0.0.1", port))]
+
+    def run(self):
+        args = self.args
+        self.install()
+        if args.tracemalloc:
+            import tracemalloc
+            tracemalloc.start()
+        log = open(args.log, "w") if args.log else None
+        counter = LogCounter(log)
+        started = time.perf_counter()
+        try:
+            with redirect_stdout(counter):
+                import pico_version
+                pico_version.socket = NtpSockets(self)
+                self.network.refresh_ms = pico_version.REFRESH_MS
+                try:
+                    if args.entry == "main":
+                        pico_version.main()
+                    else:
+                        pico_version.set_rtc_from_ntp()
+                        while True:
+                            pico_version.display_weather(args.product, args.station)
+                except SoakOver:
+                    pass
+        finally:
+            if log is not None:
+                log.close()
+        self.sampler(self.clock.now_ms + self.sampler.every_ms)
+        return self.report(time.perf_counter() - started, counter.errors, pico_version.REFRESH_MS)
+
+    def refresh_drift(self, refresh_ms):
+        """Mean gap between requests for the most fetched path, as a
+        percentage off ``refresh_ms``."""
+        if not self.network.paths:
+            return None, None
+        path, entry = max(self.network.paths.items(), key=lambda item: item[1][1])
+        if not entry[2]:
+            return path, None
+        return path, (entry[3] / entry[2] - refresh_ms) * 100 / refresh_ms
+
+    def report(self, wall_s, error_lines, refresh_ms):
+        import http_client
+        args = self.args
+        samples = self.sampler.samples
+        warm = [s for s in samples if s["hour"] >= 24] or samples[len(samples) // 2:]
+        failures = []
+
+        def growth(name):
+            values = [s[name] for s in warm if s.get(name) is not None]
+            if len(values) < 6:
+                return None
+            third = len(values) // 3
+            early = statistics.median(values[:third])
+            late = statistics.median(values[-third:])
+            return (late - early) * 100 / max(early, 1)
+
+        summary = {"virtual_days": round(self.clock.now_ms / DAY_MS, 2), "wall_s": round(wall_s, 1),
+                   "samples": len(samples), "requests": self.network.stats,
+                   "http": dict(http_client.stats), "presses": self.user.presses,
+                   "device_error_lines": error_lines}
+        for name in ("blocks", "objects", "traced", "fds"):
+            values = [s[name] for s in samples if s.get(name) is not None]
+            if values:
+                summary[f"{name}_high_water"] = max(values)
+        for name in ("blocks", "objects", "traced"):
+            pct = growth(name)
+            if pct is None:
+                continue
+            summary[f"{name}_growth_pct"] = round(pct, 2)
+            if pct > args.max_growth_pct:
+                failures.append(f"{name} grew {pct:.1f}% after the first day")
+        fds = [s["fds"] for s in warm if s.get("fds") is not None]
+        if fds and max(fds) - fds[0] > args.max_fd_growth:
+            failures.append(f"file descriptors grew from {fds[0]} to {max(fds)}")
+        left_open = max((s["sockets_open"] for s in samples), default=0)
+        summary["sockets_open_high_water"] = left_open
+        if left_open > 1:
+            failures.append(f"{left_open} responses open at once at a sample")
+        if self.network.open:
+            failures.append(f"{self.network.open} responses never closed")
+        if http_client.stats["leaked"]:
+            failures.append(f"{http_client.stats['leaked']} responses reaped as leaks")
+        if self.rtc_syncs:
+            worst = self.rtc_error_max
+            summary["rtc_syncs"] = self.rtc_syncs
+            summary["rtc_error_ms_max"] = round(worst, 1)
+            if worst > args.max_rtc_error_ms:
+                failures.append(f"RTC {worst:.0f}ms off at an NTP sync")
+        path, drift = self.refresh_drift(refresh_ms)
+        summary["refresh_path"] = path
+        if drift is not None:
+            summary["refresh_drift_pct"] = round(drift, 2)
+            if abs(drift) > args.max_drift_pct:
+                failures.append(f"refreshes of {path} drift {drift:+.1f}% from {refresh_ms}ms")
+        heap = sys.modules.get("heap")
+        if heap is not None:
+            # Reserved buffers are allocated at boot and only reused after
+            summary["heap"] = dict(heap.stats)
+            if heap.stats["allocated"] > len(heap._buffers):
+                failures.append(f"reserved buffers allocated {heap.stats['allocated']} times")
+        summary["failures"] = failures
+        return summary, samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--entry", choices=("main", "display"), default="main",
+                        help="run main() with its menus, or display_weather() only")
+    parser.add_argument("--product", default="METAR", help="product for --entry display")
+    parser.add_argument("--station", default="KBNA", help="station for --entry display")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start", type=float, help="virtual start time, seconds since the epoch")
+    parser.add_argument("--sleep-scale", type=float, default=10,
+                        help="virtual time per second slept (fewer, longer loop steps)")
+    parser.add_argument("--press-gap-min", type=float, default=20,
+                        help="mean minutes between bursts of button presses")
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of 5xx answers")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="share of connection resets")
+    parser.add_argument("--stall-rate", type=float, default=0.01, help="share of bodies that stop part way")
+    parser.add_argument("--update-s", type=int, default=300, help="how often the reports change")
+    parser.add_argument("--size", type=int, default=0, help="pad area products to this many bytes")
+    parser.add_argument("--rtc-drift-ppm", type=float, default=50)
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python allocations (slower)")
+    parser.add_argument("--max-growth-pct", type=float, default=5)
+    parser.add_argument("--max-fd-growth", type=int, default=4)
+    parser.add_argument("--max-rtc-error-ms", type=float, default=2000)
+    parser.add_argument("--max-drift-pct", type=float, default=5)
+    parser.add_argument("--log", help="file for the device's output")
+    parser.add_argument("--json", help="write the summary and samples here")
+    args = parser.parse_args(argv)
+
+    # Files the device writes (history, endpoint cache) stay out of the tree
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    if args.log:
+        args.log = os.path.abspath(args.log)
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.chdir(workdir)
+    with open("wifi_config.txt", "w") as f:
+        f.write("soak\nsoak")
+
+    summary, samples = Soak(args).run()
+    for name, value in summary.items():
+        if name != "failures":
+            print(f"{name}: {value}")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"summary": summary, "samples": samples}, f, indent=1)
+    for failure in summary["failures"]:
+        print(f"FAIL: {failure}")
+    if not summary["failures"]:
+        print("PASS")
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""Local stand-in for the NOAA weather endpoints, with fault injection.
+
+Run this on a computer (CPython):
+
+    python standin_server.py --port 8080 --latency-ms 300 --error-rate 0.1
+
+It answers the paths the products use:
+
+    /data/observations/metar/stations/<ICAO>.TXT   (tgftp METAR)
+    /data/forecasts/taf/stations/<ICAO>.TXT        (tgftp TAF)
+    /api/data/<product>?format=raw&...             (aviationweather.gov)
+
+with generated reports padded to ``--size`` bytes, so the host name in the
+request doesn't matter.  Point the device (or netreplay.py) at it with an
+``endpoint_overrides.json`` file, see endpoint_cache.py.
+
+Faults are drawn per request: extra latency before the headers, a bandwidth
+cap on the body, 5xx answers, stalls part way through the body, chunked
+transfer encoding and 304 answers to a matching If-None-Match.  ``--cert``
+and ``--key`` serve HTTPS instead of HTTP.  The settings can be changed
+while running with ``GET /_faults?name=value&...`` (the same names as the
+options, with underscores); ``GET /_stats`` returns the request counters.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULTS = {
+    "latency_ms": 0,
+    "jitter_ms": 0,
+    "bandwidth": 0,       # body bytes per second, 0 = unlimited
+    "size": 0,            # pad area products to this many bytes
+    "chunked": False,
+    "error_rate": 0.0,    # share of requests answered with a 5xx
+    "stall_rate": 0.0,    # share of bodies that stop part way
+    "stall_ms": 30000,
+    "update_s": 300,      # how often the generated reports change
+    "etag": True,
+}
+
+WRITE_SIZE = 256
+
+
+def _station(path):
+    return path.rsplit("/", 1)[-1].split(".")[0].upper()
+
+
+def _stamp(period_start):
+    return time.strftime("%d%H%MZ", time.gmtime(period_start))
+
+
+def metar_body(station, period_start):
+    day_time = time.strftime("%Y/%m/%d %H:%M", time.gmtime(period_start))
+    return f"{day_time}\n{station} {_stamp(period_start)} 18005KT 10SM FEW040 22/12 A3001\n"
+
+
+def taf_body(station, period_start):
+    t = time.gmtime(period_start)
+    start = f"{t.tm_mday:02d}{t.tm_hour:02d}"
+    end_t = time.gmtime(period_start + 24 * 3600)
+    end = f"{end_t.tm_mday:02d}{end_t.tm_hour:02d}"
+    mid_t = time.gmtime(period_start + 6 * 3600)
+    mid = f"{mid_t.tm_mday:02d}{mid_t.tm_hour:02d}00"
+    return (
+        time.strftime("%Y/%m/%d %H:%M\n", t)
+        + f"TAF {station} {_stamp(period_start)} {start}/{end} 18008KT P6SM SCT050\n"
+        + f"      FM{mid} 21012G20KT P6SM BKN035\n"
+    )
+
+
+def area_body(product, period_start, size):
+    lines = []
+    total = 0
+    n = 0
+    while True:
+        line = f"{product.upper()} {n + 1} VALID {_stamp(period_start)} SAMPLE REPORT TEXT FOR LOAD TESTING"
+        if n and total + len(line) + 1 > size:
+            break
+        lines.append(line)
+        total += len(line) + 1
+        n += 1
+    return "\n".join(lines) + "\n"
+
+
+def body_for(path, period_start, size=0):
+    """Generated product text for a request path, or None if unknown."""
+    if path.startswith("/data/observations/metar/stations/"):
+        return metar_body(_station(path), period_start)
+    if path.startswith("/data/forecasts/taf/stations/"):
+        return taf_body(_station(path), period_start)
+    if path.startswith("/api/data/"):
+        product = path.rsplit("/", 1)[-1]
+        return area_body(product, period_start, size or 2048)
+    return None
+
+
+class Faults:
+    def __init__(self, settings, seed=None):
+        self.settings = dict(settings)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "errors": 0, "stalls": 0, "bytes": 0}
+
+    def update(self, values):
+        with self.lock:
+            for name, value in values.items():
+                if name not in DEFAULTS:
+                    continue
+                default = DEFAULTS[name]
+                if isinstance(default, bool):
+                    value = value.lower() in ("1", "true", "yes")
+                else:
+                    value = type(default)(value)
+                self.settings[name] = value
+
+    def draw(self):
+        """Settings for one request plus the faults that hit it."""
+        with self.lock:
+            s = dict(self.settings)
+            s["latency"] = s["latency_ms"] + self.random.uniform(0, s["jitter_ms"])
+            s["error"] = self.random.random() < s["error_rate"]
+            s["status"] = self.random.choice((500, 502, 503))
+            s["stall"] = self.random.random() < s["stall_rate"]
+            return s
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.stats[name] += n
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults = None
+
+    def log_message(self, fmt, *args):
+        print(f"{self.address_string()} {fmt % args}")
+
+    def _send_json(self, value):
+        body = json.dumps(value).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self, path, s):
+        period_start = int(time.time() // s["update_s"] * s["update_s"])
+        return body_for(path, period_start, s["size"])
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        if parts.path == "/_faults":
+            self.faults.update(query)
+            return self._send_json(self.faults.settings)
+        if parts.path == "/_stats":
+            return self._send_json(self.faults.stats)
+
+        faults = self.faults
+        faults.count("requests")
+        s = faults.draw()
+        if s["latency"]:
+            time.sleep(s["latency"] / 1000)
+
+        if s["error"]:
+            faults.count("errors")
+            self.send_response(s["status"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = self._body(parts.path, s)
+        if text is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = text.encode()
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if s["etag"] and self.headers.get("If-None-Match") == etag:
+            faults.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        if s["etag"]:
+            self.send_header("ETag", etag)
+        if s["chunked"]:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        stall_at = len(body) // 2 if s["stall"] else None
+        sent = 0
+        try:
+            while sent < len(body):
+                if stall_at is not None and sent >= stall_at:
+                    faults.count("stalls")
+                    time.sleep(s["stall_ms"] / 1000)
+                    self.close_connection = True
+                    return
+                end = min(sent + WRITE_SIZE, stall_at if stall_at is not None else len(body))
+                piece = body[sent:end]
+                if s["chunked"]:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+                else:
+                    self.wfile.write(piece)
+                self.wfile.flush()
+                sent += len(piece)
+                if s["bandwidth"]:
+                    time.sleep(len(piece) / s["bandwidth"])
+            if s["chunked"]:
+                self.wfile.write(b"0\r\n\r\n")
+            faults.count("ok")
+        finally:
+            faults.count("bytes", sent)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cert", help="certificate file, serves HTTPS")
+    parser.add_argument("--key", help="private key file for --cert")
+    parser.add_argument("--seed", type=int, help="seed for repeatable faults")
+    parser.add_argument("--latency-ms", type=int, default=0, help="delay before the headers")
+    parser.add_argument("--jitter-ms", type=int, default=0, help="random extra delay up to this")
+    parser.add_argument("--bandwidth", type=int, default=0, help="body bytes per second (0 = unlimited)")
+    parser.add_argument("--size", type=int, default=0, help="area product payload size in bytes")
+    parser.add_argument("--chunked", action="store_true", help="use chunked transfer encoding")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 5xx answers")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of bodies that stall")
+    parser.add_argument("--stall-ms", type=int, default=DEFAULTS["stall_ms"], help="how long a stall lasts")
+    parser.add_argument("--update-s", type=int, default=DEFAULTS["update_s"], help="report change interval")
+    parser.add_argument("--no-etag", dest="etag", action="store_false", help="don't send ETags or 304s")
+    args = parser.parse_args(argv)
+
+    settings = {name: getattr(args, name) for name in DEFAULTS}
+    Handler.faults = Faults(settings, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    scheme = "http"
+    if args.cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.cert, args.key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    print(f"Serving on {scheme}://{args.host}:{args.port} with {settings}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Nearest-station lookups from the grid file built by build_station_index.py.
+#
+# stations.grd buckets every station in stations.bin into a lat/lon grid
+# cell.  A query reads the bucket offsets for the cells around a point and
+# then only the entries in those buckets, expanding ring by ring up to a
+# fixed limit, so the number of reads is bounded and RAM holds just the N
+# best candidates.
+
+import math
+import struct
+
+GRID_FILE = "stations.grd"
+MAGIC = b"SGR1"
+HEADER = "<4sHiiHHI"      # magic, cell size, lat0, lon0 (centidegrees), rows, cols, entries
+ENTRY = "<Iii"            # record index in stations.bin, lat, lon (1e-5 degrees)
+HEADER_SIZE = struct.calcsize(HEADER)
+ENTRY_SIZE = struct.calcsize(ENTRY)
+COORD_SCALE = 100000
+NM_PER_DEGREE = 60
+MAX_RINGS = 4
+
+
+def distance_nm(lat1, lon1, lat2, lon2):
+    """Equirectangular distance; plenty for ranking nearby stations."""
+    x = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return math.sqrt(x * x + y * y) * NM_PER_DEGREE
+
+
+class StationGrid:
+    def __init__(self, path=GRID_FILE):
+        self.f = open(path, "rb")
+        magic, cell, lat0, lon0, rows, cols, count = struct.unpack(HEADER, self.f.read(HEADER_SIZE))
+        if magic != MAGIC:
+            self.f.close()
+            raise ValueError(f"{path} is not a station grid")
+        self.cell = cell / 100
+        self.lat0 = lat0 / 100
+        self.lon0 = lon0 / 100
+        self.rows = rows
+        self.cols = cols
+        self.entries_at = HEADER_SIZE + (rows * cols + 1) * 4
+        self._entry = bytearray(ENTRY_SIZE)
+
+    def close(self):
+        self.f.close()
+
+    def _cell_of(self, lat, lon):
+        return int((lat - self.lat0) // self.cell), int((lon - self.lon0) // self.cell)
+
+    def _bucket(self, row, col):
+        """``(first, end)`` entry numbers for one cell."""
+        self.f.seek(HEADER_SIZE + (row * self.cols + col) * 4)
+        return struct.unpack("<II", self.f.read(8))
+
+    def _scan_cell(self, row, col):
+        """Yield ``(index, lat, lon)`` for the stations in one cell."""
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return
+        first, end = self._bucket(row, col)
+        for n in range(first, end):
+            self.f.seek(self.entries_at + n * ENTRY_SIZE)
+            self.f.readinto(self._entry)
+            index, lat, lon = struct.unpack(ENTRY, self._entry)
+            yield index, lat / COORD_SCALE, lon / COORD_SCALE
+
+    def _ring(self, row, col, k):
+        if k == 0:
+            yield row, col
+            return
+        for c in range(col - k, col + k + 1):
+            yield row - k, c
+            yield row + k, c
+        for r in range(row - k + 1, row + k):
+            yield r, col - k
+            yield r, col + k
+
+    def nearest(self, lat, lon, n=5, max_rings=MAX_RINGS):
+        """Return up to ``n`` ``(distance_nm, index)`` pairs, closest first.
+
+        ``index`` is the station's record number in stations.bin.
+        """
+        row, col = self._cell_of(lat, lon)
+        best = []
+        cos_lat = math.cos(math.radians(min(abs(lat) + max_rings * self.cell, 89)))
+        for k in range(max_rings + 1):
+            for r, c in self._ring(row, col, k):
+                for index, slat, slon in self._scan_cell(r, c):
+                    d = distance_nm(lat, lon, slat, slon)
+                    if len(best) < n or d < best[-1][0]:
+                        best.append((d, index))
+                        best.sort()
+                        del best[n:]
+            # Anything in a further ring is at least k cells away
+            if len(best) == n and best[-1][0] <= k * self.cell * NM_PER_DEGREE * cos_lat:
+                break
+        return best
+
+
+def open_grid(path=GRID_FILE):
+    """Open the station grid, or return None if it isn't on the device."""
+    try:
+        return StationGrid(path)
+    except (OSError, ValueError) as e:
+        print(f"Station grid unavailable: {e}")
+        return None
@@ -0,0 +1,162 @@
+# Station lookups from the on-flash index built by build_station_index.py.
+#
+# stations.bin is a small header followed by fixed-size records sorted by
+# ICAO code, so a lookup is a binary search that seeks and reads one record
+# at a time.  Only a single record buffer is held in RAM regardless of how
+# many stations are in the file.
+
+import struct
+
+INDEX_FILE = "stations.bin"
+MAGIC = b"STX1"
+HEADER = "<4sHI"          # magic, record size, record count
+RECORD = "<4s2s26sii"     # icao, state, name, lat, lon (1e-5 degrees)
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD_SIZE = struct.calcsize(RECORD)
+COORD_SCALE = 100000
+
+
+class StationIndex:
+    def __init__(self, path=INDEX_FILE):
+        self.f = open(path, "rb")
+        magic, size, count = struct.unpack(HEADER, self.f.read(HEADER_SIZE))
+        if magic != MAGIC or size != RECORD_SIZE:
+            self.f.close()
+            raise ValueError(f"{path} is not a station index")
+        self.count = count
+        self._buf = bytearray(RECORD_SIZE)
+
+    def close(self):
+        self.f.close()
+
+    def icao_at(self, i):
+        self.f.seek(HEADER_SIZE + i * RECORD_SIZE)
+        return self.f.read(4)
+
+    def record(self, i):
+        """Return record ``i`` as a dict like the ``metar_stations`` entries."""
+        self.f.seek(HEADER_SIZE + i * RECORD_SIZE)
+        self.f.readinto(self._buf)
+        icao, state, name, lat, lon = struct.unpack(RECORD, self._buf)
+        return {
+            "icao": icao.decode(),
+            "state": state.decode().strip(),
+            "name": name.rstrip(b"\0 ").decode(),
+            "lat": lat / COORD_SCALE,
+            "lon": lon / COORD_SCALE,
+        }
+
+    def lower_bound(self, key, lo=0, hi=None):
+        """First index whose ICAO code is >= ``key`` (bytes)."""
+        if hi is None:
+            hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.icao_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, icao):
+        """Index of ``icao`` or -1 when it isn't in the file."""
+        key = icao.upper().encode()
+        i = self.lower_bound(key)
+        if i < self.count and self.icao_at(i) == key:
+            return i
+        return -1
+
+    def get(self, icao):
+        i = self.find(icao)
+        return self.record(i) if i >= 0 else None
+
+    def prefix_range(self, prefix, lo=0, hi=None):
+        """``(lo, hi)`` index range of codes starting with ``prefix``."""
+        key = prefix.encode()
+        lo = self.lower_bound(key, lo, hi)
+        # 0x7f sorts after every letter and digit
+        return lo, self.lower_bound(key + b"\x7f", lo, hi)
+
+    def next_chars(self, prefix, lo, hi):
+        """Characters that can follow ``prefix`` within ``lo:hi``.
+
+        Skips from one distinct next character to the following one with a
+        binary search, so the cost depends on the number of distinct
+        characters rather than the number of matching stations.
+        """
+        key = prefix.encode()
+        pos = len(key)
+        chars = []
+        while lo < hi:
+            c = self.icao_at(lo)[pos:pos + 1]
+            chars.append(c.decode())
+            lo = self.lower_bound(key + c + b"\x7f", lo, hi)
+        return "".join(chars)
+
+
+class Completer:
+    """Prefix completion state for typing an ICAO code.
+
+    Without an index every character is allowed and any four character
+    code is accepted, matching the old free-entry behaviour.
+    """
+
+    CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    # Offered first for a new code when it can start one, as most do here
+    FIRST = "K"
+
+    def __init__(self, index=None):
+        self.index = index
+        self.prefix = ""
+        self._narrow()
+
+    def _narrow(self):
+        if self.index is None:
+            self.lo, self.hi = 0, 0
+            self.choices = self.CHARACTERS if len(self.prefix) < 4 else ""
+            return
+        self.lo, self.hi = self.index.prefix_range(self.prefix)
+        if len(self.prefix) < 4:
+            self.choices = self.index.next_chars(self.prefix, self.lo, self.hi)
+        else:
+            self.choices = ""
+
+    def push(self, ch):
+        """Append ``ch``; a prefix matching a single station is filled in."""
+        if ch not in self.choices:
+            return False
+        self.prefix += ch
+        self._narrow()
+        if self.index is not None and self.hi - self.lo == 1 and len(self.prefix) < 4:
+            self.prefix = self.index.icao_at(self.lo).decode()
+            self._narrow()
+        return True
+
+    def pop(self):
+        self.prefix = self.prefix[:-1]
+        self._narrow()
+
+    def matches(self, ch="", limit=3):
+        """Top stations for the current prefix plus candidate ``ch``."""
+        if self.index is None:
+            return []
+        lo, hi = self.index.prefix_range(self.prefix + ch, self.lo, self.hi)
+        return [self.index.record(i) for i in range(lo, min(hi, lo + limit))]
+
+    def start(self):
+        """Index in ``choices`` of the character to offer first."""
+        if self.prefix:
+            return 0
+        return max(self.choices.find(self.FIRST), 0)
+
+    def is_complete(self):
+        return len(self.prefix) == 4
+
+
+def open_index(path=INDEX_FILE):
+    """Open the station index, or return None if it isn't on the device."""
+    try:
+        return StationIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"Station index unavailable: {e}")
+        return None
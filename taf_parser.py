@@ -0,0 +1,205 @@
+# Incremental TAF parser.
+#
+# Lines are fed in as they arrive and split into change groups (the base
+# forecast, FM, BECMG, TEMPO and PROB).  Each group is kept as five ints in
+# a flat array: kind, valid-from, valid-to and the start/end offsets of its
+# text, so "what is valid now" is a scan of a handful of ints instead of
+# re-parsing the forecast.
+#
+# Times are minutes from the start of the month the forecast starts in.
+# Days that are much lower than the start day belong to the next month.
+
+from array import array
+
+BASE = 0
+FM = 1
+BECMG = 2
+TEMPO = 3
+PROB = 4
+
+FIELDS = 5
+DAY_MINUTES = 1440
+MONTH_MINUTES = 31 * DAY_MINUTES
+
+
+def _is_period(word):
+    """DDHH/DDHH validity period."""
+    return len(word) == 9 and word[4] == "/" and word[:4].isdigit() and word[5:].isdigit()
+
+
+class Taf:
+    def __init__(self):
+        self.text = ""
+        self.groups = array("i")
+        self.start_day = 0
+
+    def __len__(self):
+        return len(self.groups) // FIELDS
+
+    def minutes(self, day, hour, minute=0):
+        """Convert a day/hour/minute to this forecast's time scale."""
+        value = ((day - 1) * 24 + hour) * 60 + minute
+        if self.start_day and day < self.start_day - 15:
+            value += MONTH_MINUTES
+        elif self.start_day and day > self.start_day + 15:
+            value -= MONTH_MINUTES
+        return value
+
+    def group(self, i):
+        """``(kind, start, end, text)`` for group ``i``."""
+        g = self.groups
+        n = i * FIELDS
+        return g[n], g[n + 1], g[n + 2], self.text[g[n + 3]:g[n + 4]].replace("\n", " ")
+
+    def kind(self, i):
+        return self.groups[i * FIELDS]
+
+    def valid_at(self, t):
+        """Indices of the groups in effect at time ``t``.
+
+        The first entry is the prevailing forecast (base or the latest FM that
+        has started), followed by BECMG groups that have started since and
+        any TEMPO/PROB groups covering ``t``.
+        """
+        g = self.groups
+        prevailing = []
+        temporary = []
+        for i in range(len(self)):
+            n = i * FIELDS
+            kind, start, end = g[n], g[n + 1], g[n + 2]
+            if start > t:
+                continue
+            if kind in (BASE, FM):
+                prevailing = [i]
+            elif kind == BECMG:
+                # Amends the prevailing forecast from its start onwards
+                prevailing.append(i)
+            elif t < end:
+                temporary.append(i)
+        return prevailing + temporary
+
+    def next_after(self, t):
+        """Index of the first group starting after ``t``, or None."""
+        g = self.groups
+        for i in range(len(self)):
+            if g[i * FIELDS + 1] > t:
+                return i
+        return None
+
+    def summary(self, t):
+        """Forecast text with the groups valid at ``t`` and the next one first."""
+        current = self.valid_at(t)
+        upcoming = self.next_after(t)
+        lines = []
+        for i in current:
+            lines.append("NOW " + self.group(i)[3])
+        if upcoming is not None:
+            lines.append("NEXT " + self.group(upcoming)[3])
+        shown = set(current)
+        if upcoming is not None:
+            shown.add(upcoming)
+        rest = [self.group(i)[3] for i in range(len(self)) if i not in shown]
+        if rest:
+            lines.append("--")
+            lines.extend(rest)
+        return "\n".join(lines)
+
+
+class TafParser:
+    """Feed TAF lines one at a time, then call ``finish()``."""
+
+    def __init__(self):
+        self.taf = Taf()
+        self._parts = []
+        self._pos = 0
+        self._started = False
+        self._kind = None
+        self._start = 0
+        self._end = 0
+        self._text_start = 0
+        self._text_end = 0
+        self._in_prob = False
+        self._valid_end = 0
+
+    def _close_group(self):
+        if self._kind is not None:
+            self.taf.groups.extend((self._kind, self._start, self._end,
+                                    self._text_start, self._text_end))
+        self._kind = None
+
+    def _open_group(self, kind, offset):
+        self._close_group()
+        self._kind = kind
+        self._start = 0
+        self._end = self._valid_end
+        self._text_start = offset
+        self._text_end = offset
+
+    def _period(self, word):
+        taf = self.taf
+        if not taf.start_day:
+            taf.start_day = int(word[0:2])
+        start = taf.minutes(int(word[0:2]), int(word[2:4]))
+        end = taf.minutes(int(word[5:7]), int(word[7:9]))
+        return start, end
+
+    def feed(self, line):
+        line = line.strip()
+        offset = self._pos
+        self._parts.append(line)
+        self._pos += len(line) + 1
+        if not line:
+            return
+
+        for word in line.split(" "):
+            word_end = offset + len(word)
+            if not self._started:
+                if word == "TAF":
+                    self._started = True
+                    self._open_group(BASE, offset)
+                offset = word_end + 1
+                continue
+
+            if word.startswith("FM") and len(word) == 8 and word[2:].isdigit():
+                self._open_group(FM, offset)
+                self._start = self.taf.minutes(int(word[2:4]), int(word[4:6]), int(word[6:8]))
+            elif word in ("BECMG", "TEMPO") and not self._in_prob:
+                # "PROB30 TEMPO" stays a single PROB group
+                self._open_group(BECMG if word == "BECMG" else TEMPO, offset)
+            elif word.startswith("PROB") and word[4:].isdigit():
+                self._open_group(PROB, offset)
+                self._in_prob = True
+            elif _is_period(word):
+                start, end = self._period(word)
+                if self._kind == BASE and not self._valid_end:
+                    self._valid_end = end
+                self._start, self._end = start, end
+                self._in_prob = False
+            self._text_end = word_end
+            offset = word_end + 1
+
+    def finish(self):
+        """Close the last group, fix FM end times and return the Taf."""
+        self._close_group()
+        taf = self.taf
+        taf.text = "\n".join(self._parts)
+        self._parts = []
+        g = taf.groups
+        # An FM group lasts until the next FM group or the end of the TAF
+        last_end = self._valid_end
+        for i in range(len(taf) - 1, -1, -1):
+            n = i * FIELDS
+            if g[n] == FM:
+                g[n + 2] = last_end
+                last_end = g[n + 1]
+            elif g[n] == BASE:
+                g[n + 2] = last_end
+        return taf
+
+
+def parse(text):
+    """Parse a whole TAF string."""
+    parser = TafParser()
+    for line in text.split("\n"):
+        parser.feed(line)
+    return parser.finish()
@@ -0,0 +1,158 @@
+# Pre-laid-out product payloads.
+#
+# A gateway (gateway.py) that knows a display's line width can send a
+# product already wrapped and split into pages, instead of raw text the
+# device has to clean, wrap and paginate itself.  The payload is one
+# binary blob read in place with ``struct``:
+#
+#   header   "<4sBBHHH"  magic, characters per line, flags, page count,
+#                        line count, text size
+#   fields   "<H8h"      decoded METAR (see metar_decode.py), if FLAG_FIELDS
+#   pages    H * (pages + 1)   index of each page's first line
+#   jumps    h * pages         next page mentioning the station, if FLAG_JUMPS
+#   lines    H * (lines + 1)   offset of each line in the text
+#   text     the lines back to back, UTF-8
+#
+# The device asks for it with an X-Wire-Width request header and recognises
+# it by CONTENT_TYPE; a server that ignores the header sends plain text.
+
+import struct
+
+MAGIC = b"PMW1"
+CONTENT_TYPE = "application/x-picometar"
+WIDTH_HEADER = "X-Wire-Width"
+
+HEADER = "<4sBBHHH"
+FIELDS = "<H8h"
+HEADER_SIZE = struct.calcsize(HEADER)
+FIELDS_SIZE = struct.calcsize(FIELDS)
+
+FLAG_FIELDS = 1
+FLAG_JUMPS = 2
+
+
+def wrap_words(text, chars):
+    """Word-wrap ``text`` to ``chars`` characters per line.
+
+    The display and the gateway both wrap with this, so a page laid out by
+    either breaks in the same places.
+    """
+    lines = []
+    current = ""
+    for word in text.split(" "):
+        if len(current) + len(word) + (1 if current else 0) > chars:
+            lines.append(current)
+            current = word
+        else:
+            if current:
+                current += " "
+            current += word
+    lines.append(current)
+    return lines
+
+
+def encode(pages, width, fields=None, jumps=None):
+    """Pack ``pages`` (lists of already wrapped lines) into a payload."""
+    lines = []
+    page_table = [0]
+    for page in pages:
+        lines.extend(line.encode() for line in page)
+        page_table.append(len(lines))
+    line_table = [0]
+    for line in lines:
+        line_table.append(line_table[-1] + len(line))
+    text = b"".join(lines)
+    if len(text) > 0xFFFF or len(lines) > 0xFFFF:
+        raise ValueError("payload too large")
+
+    flags = (FLAG_FIELDS if fields else 0) | (FLAG_JUMPS if jumps is not None else 0)
+    parts = [struct.pack(HEADER, MAGIC, width, flags, len(pages), len(lines), len(text))]
+    if fields:
+        parts.append(struct.pack(FIELDS, *fields))
+    parts.append(struct.pack(f"<{len(page_table)}H", *page_table))
+    if jumps is not None:
+        parts.append(struct.pack(f"<{len(jumps)}h", *jumps))
+    parts.append(struct.pack(f"<{len(line_table)}H", *line_table))
+    parts.append(text)
+    return b"".join(parts)
+
+
+def is_payload(data):
+    return data[:4] == MAGIC
+
+
+class Payload:
+    """A received payload, read in place."""
+
+    def __init__(self, data):
+        self.data = data
+        magic, self.width, self.flags, self.page_count, self.line_count, size = \
+            struct.unpack_from(HEADER, data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a wire payload")
+        pos = HEADER_SIZE
+        self._fields = pos if self.flags & FLAG_FIELDS else None
+        if self._fields is not None:
+            pos += FIELDS_SIZE
+        self._pages = pos
+        pos += 2 * (self.page_count + 1)
+        self._jumps = pos if self.flags & FLAG_JUMPS else None
+        if self._jumps is not None:
+            pos += 2 * self.page_count
+        self._lines = pos
+        self._text = pos + 2 * (self.line_count + 1)
+        self.size = self._text + size
+        if self.size > len(data):
+            raise ValueError("truncated wire payload")
+
+    def __len__(self):
+        return self.size
+
+    def fields(self):
+        """Decoded METAR fields, or None."""
+        if self._fields is None:
+            return None
+        return struct.unpack_from(FIELDS, self.data, self._fields)
+
+    def line(self, i):
+        a, b = struct.unpack_from("<HH", self.data, self._lines + 2 * i)
+        return str(memoryview(self.data)[self._text + a:self._text + b], "utf-8")
+
+    def page_range(self, i):
+        return struct.unpack_from("<HH", self.data, self._pages + 2 * i)
+
+    def next_mention(self, i):
+        if self._jumps is None:
+            return None
+        target = struct.unpack_from("<h", self.data, self._jumps + 2 * i)[0]
+        return None if target < 0 else target
+
+    def pages(self):
+        return WirePages(self)
+
+
+class WirePages:
+    """Pages of a payload, built one page at a time when shown."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._page = -1
+        self._lines = None
+
+    def __len__(self):
+        return max(self.payload.page_count, 1)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i != self._page:
+            if self.payload.page_count:
+                first, end = self.payload.page_range(i)
+                self._lines = [self.payload.line(j) for j in range(first, end)]
+            else:
+                self._lines = [""]
+            self._page = i
+        return self._lines
+
+    def next_mention(self, i):
+        return self.payload.next_mention(i)